@@ -1,26 +1,167 @@
+import atexit
 import configparser
+import os
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 DEFAULT_CONFIG_PATH = Path(__file__).parent / "settings.ini"
 
-class ConfigTools:
-    def __init__(self, config_file: Union[str, Path] = DEFAULT_CONFIG_PATH ) -> None:
-        self._config = configparser.ConfigParser()
-        self._config_file = Path(config_file)
-        self._load_confg()
-    
-    def _load_confg(self) -> None:
+
+class _ConfigStore:
+    """进程内共享的配置文件存储
+
+    配置文件只解析一次，解析结果保存为不可变的快照，读取时直接访问快照，不加锁；
+    每隔 reload_interval 秒检查一次文件修改时间，文件被外部修改时重新加载。
+    写入先更新内存中的快照，再延迟 write_delay 秒合并写盘（先写临时文件再替换），
+    避免多个线程同时改写整个文件。
+    """
+    def __init__(self, config_file: Path, reload_interval: float = 1.0, write_delay: float = 0.5):
+        self.config_file = config_file
+        self.reload_interval = reload_interval
+        self.write_delay = write_delay
+        self._lock = threading.RLock()
+        self._parser = configparser.ConfigParser()
+        # 快照: (各配置节合并 DEFAULT 后的配置, 各配置节自身的配置, DEFAULT 配置)
+        self._snapshot: Tuple[Dict[str, Dict[str, str]], Dict[str, Dict[str, str]], Dict[str, str]] = ({}, {}, {})
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        # 尚未写盘的修改，重新加载外部修改后重新应用
+        self._pending: List[Tuple[str, str, Optional[str]]] = []
+        self._timer: Optional[threading.Timer] = None
+        self._load()
+        atexit.register(self.flush)
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return self.config_file.stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _load(self) -> None:
         """加载配置文件，如果文件不存在则创建"""
         try:
-            if self._config_file.exists():
-                self._config.read(self._config_file, encoding='utf-8')
+            parser = configparser.ConfigParser()
+            if self.config_file.exists():
+                parser.read(self.config_file, encoding='utf-8')
             else:
-                self._config_file.touch()
+                self.config_file.touch()
         except Exception as e:
             raise ConfigError(f"无法加载配置文件: {e}")
-    
+        with self._lock:
+            self._parser = parser
+            for section, key, value in self._pending:
+                self._apply(section, key, value)
+            self._mtime = self._file_mtime()
+            self._rebuild_snapshot()
+
+    def _rebuild_snapshot(self) -> None:
+        parser = self._parser
+        defaults = dict(parser.defaults())
+        merged, own = {}, {}
+        for section in parser.sections():
+            try:
+                merged[section] = dict(parser.items(section))
+            except configparser.InterpolationError:
+                merged[section] = dict(parser.items(section, raw=True))
+            own[section] = {key: value for key, value in parser.items(section, raw=True) if key not in defaults}
+        # 整体替换引用，读取方总是看到完整的一个版本
+        self._snapshot = (merged, own, defaults)
+
+    def _maybe_reload(self) -> None:
+        """按时间间隔检查文件修改时间，文件变化时重新加载"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        if self._file_mtime() != self._mtime:
+            self._load()
+
+    def get(self, section: str, key: str, default: Any = None) -> Any:
+        self._maybe_reload()
+        values = self._snapshot[0].get(section)
+        if values is None:
+            return default
+        return values.get(self._parser.optionxform(key), default)
+
+    def get_section(self, section: str) -> Dict[str, str]:
+        self._maybe_reload()
+        return dict(self._snapshot[1].get(section, {}))
+
+    def sections(self) -> List[str]:
+        self._maybe_reload()
+        return list(self._snapshot[0])
+
+    def _apply(self, section: str, key: str, value: Optional[str]) -> bool:
+        if value is None:
+            return self._parser.has_section(section) and self._parser.remove_option(section, key)
+        if not self._parser.has_section(section):
+            self._parser.add_section(section)
+        self._parser.set(section, key, value)
+        return True
+
+    def set(self, section: str, key: str, value: Optional[str]) -> bool:
+        """修改配置（value 为 None 时删除），立即生效，延迟写盘"""
+        with self._lock:
+            self._maybe_reload()
+            changed = self._apply(section, key, value)
+            if changed:
+                self._pending.append((section, key, value))
+                self._rebuild_snapshot()
+                self._schedule_flush()
+            return changed
+
+    def _schedule_flush(self) -> None:
+        if self._timer is None:
+            self._timer = threading.Timer(self.write_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        """把尚未写盘的修改写入配置文件（先写临时文件再替换）"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            tmp_path = self.config_file.with_suffix(self.config_file.suffix + ".tmp")
+            try:
+                with open(tmp_path, "w", encoding='utf-8') as f:
+                    self._parser.write(f)
+                os.replace(tmp_path, self.config_file)
+            except Exception as e:
+                raise ConfigError(f"保存配置文件失败: {e}")
+            self._pending = []
+            self._mtime = self._file_mtime()
+
+
+_stores: Dict[Path, _ConfigStore] = {}
+_stores_lock = threading.Lock()
+
+
+def _get_store(config_file: Path) -> _ConfigStore:
+    """获取配置文件对应的共享存储，每个文件在进程内只解析一次"""
+    store = _stores.get(config_file)
+    if store is None:
+        with _stores_lock:
+            # 同一文件的不同写法共享同一个存储
+            resolved = config_file.resolve()
+            store = _stores.get(resolved)
+            if store is None:
+                store = _ConfigStore(config_file)
+                _stores[resolved] = store
+            _stores[config_file] = store
+    return store
+
+
+class ConfigTools:
+    def __init__(self, config_file: Union[str, Path] = DEFAULT_CONFIG_PATH ) -> None:
+        self._config_file = Path(config_file)
+        self._store = _get_store(self._config_file)
+
     def get_config(self, section: str, key: str, default: Any = None) -> Any:
         """
         获取配置值
@@ -29,35 +170,26 @@ class ConfigTools:
         :param default: 默认值
         :return: 配置值
         """
-        try:
-            return self._config[section][key]
-        except KeyError:
-            return default
-    
+        return self._store.get(section, key, default)
+
     def set_config(self, section: str, key: str, value: Any) -> None:
         """
-        设置配置值
+        设置配置值（立即生效，延迟合并写入文件）
         :param section: 配置节
         :param key: 配置键
         :param value: 配置值
         """
         try:
-            if section not in self._config:
-                self._config.add_section(section)
-            
-            self._config[section][key] = str(value)
-            self._save_config()
+            self._store.set(section, key, str(value))
+        except ConfigError:
+            raise
         except Exception as e:
             raise ConfigError(f"设置配置失败: {e}")
-    
-    def _save_config(self) -> None:
-        """保存配置到文件"""
-        try:
-            with open(self._config_file, "w", encoding='utf-8') as f:
-                self._config.write(f)
-        except Exception as e:
-            raise ConfigError(f"保存配置文件失败: {e}")
-    
+
+    def flush(self) -> None:
+        """立即把尚未写盘的修改写入配置文件"""
+        self._store.flush()
+
     def remove_option(self, section: str, key: str) -> bool:
         """
         删除指定的配置项
@@ -66,13 +198,21 @@ class ConfigTools:
         :return: 是否删除成功
         """
         try:
-            return self._config.remove_option(section, key)
+            return self._store.set(section, key, None)
         except Exception:
             return False
-    
+
     def get_sections(self) -> list[str]:
         """获取所有配置节"""
-        return self._config.sections()
+        return self._store.sections()
+
+    def get_section(self, section: str) -> dict[str, str]:
+        """
+        获取配置节中的全部配置项（不包含 DEFAULT 节继承的项）
+        :param section: 配置节
+        :return: 配置键到值的映射，配置节不存在时为空
+        """
+        return self._store.get_section(section)
 
 
 class ConfigError(Exception):
@@ -86,6 +226,3 @@ if __name__ == "__main__":
     config.set_config("Running.Settings", "LastTradeDate", datetime.now().strftime("%Y%m%d"))
     print(config.get_config("Running.Settings", "LastTradeDate"))
     print(config.get_sections())
-
-
-
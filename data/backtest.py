@@ -0,0 +1,175 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data.panel_store import PricePanelStore
+from data.rolling_high import forward_max, forward_min, rolling_max
+from data.tools import logger
+
+# 每组参数汇总的统计量
+_STAT_NAMES = ["events", "close_up", "close_sum", "high_up", "high_sum", "low_down", "low_sum"]
+
+
+def _align_bars(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """把每只股票的有效K线移到数组底部（保持顺序），停牌和未上市的缺失行移到顶部
+
+    对齐后按行计算的窗口即为按每只股票自己的K线计数，与单只股票分析一致。
+
+    Returns:
+        tuple: (high, low, close, bar_index)，bar_index 为每行在该股票K线中的序号，缺失行为 -1
+    """
+    valid = ~np.isnan(high)
+    order = np.argsort(valid, axis=0, kind='stable')
+    high, low, close = (np.take_along_axis(x, order, axis=0) for x in (high, low, close))
+    n_rows = high.shape[0]
+    bar_index = np.arange(n_rows)[:, None] - (n_rows - valid.sum(axis=0))[None, :]
+    return high, low, close, bar_index
+
+
+def _cooldown_mask(candidates: np.ndarray, cooldown: int) -> np.ndarray:
+    """对所有股票同时按行扫描应用冷却期，返回选中的事件掩码"""
+    selected = np.zeros_like(candidates)
+    next_allowed = np.zeros(candidates.shape[1], dtype=np.int64)
+    for row in np.flatnonzero(candidates.any(axis=1)):
+        hit = candidates[row] & (row >= next_allowed)
+        selected[row] = hit
+        next_allowed[hit] = row + cooldown + 1
+    return selected
+
+
+def _backtest_chunk(high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                    grid: List[Tuple[int, int, int]]) -> np.ndarray:
+    """计算一组股票在全部参数组合下的统计量之和，形状为 (参数组合数, 统计量数)"""
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    high, low, close, bar_index = _align_bars(high, low, close)
+    n_rows = high.shape[0]
+    rows = np.arange(n_rows)[:, None]
+
+    # 不同参数组合之间共享的计算：每个新高窗口的候选事件、每个持有天数的收益
+    candidates = {}
+    for n_days_new_high in sorted({g[0] for g in grid}):
+        mask = (high == rolling_max(high, n_days_new_high + 1)) & (bar_index >= n_days_new_high)
+        mask[-1] = False
+        candidates[n_days_new_high] = mask
+    returns = {}
+    for next_n_days in sorted({g[1] for g in grid}):
+        end = np.minimum(rows + next_n_days, n_rows) - 1
+        close_end = np.take_along_axis(close, np.broadcast_to(end, close.shape), axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns[next_n_days] = (
+                np.round((close_end / high - 1) * 100, 2),
+                np.round((forward_max(high, next_n_days) / high - 1) * 100, 2),
+                np.round((forward_min(low, next_n_days) / high - 1) * 100, 2),
+            )
+    events = {}
+    for n_days_new_high, cooldown in sorted({(g[0], g[2]) for g in grid}):
+        events[(n_days_new_high, cooldown)] = _cooldown_mask(candidates[n_days_new_high], cooldown)
+
+    stats = np.zeros((len(grid), len(_STAT_NAMES)))
+    for i, (n_days_new_high, next_n_days, cooldown) in enumerate(grid):
+        mask = events[(n_days_new_high, cooldown)]
+        close_ret, high_ret, low_ret = (r[mask] for r in returns[next_n_days])
+        stats[i] = [
+            mask.sum(),
+            (close_ret > 0).sum(), np.nansum(close_ret),
+            (high_ret > 0).sum(), np.nansum(high_ret),
+            (low_ret < 0).sum(), np.nansum(low_ret),
+        ]
+    return stats
+
+
+def backtest_new_high(high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                      n_days_new_high_list: Sequence[int], next_n_days_list: Sequence[int],
+                      n_days_next_new_high_list: Sequence[int],
+                      max_workers: Optional[int] = None, chunk_size: int = 500) -> pd.DataFrame:
+    """对 日期 × 股票 的价格数组批量回测新高策略的全部参数组合
+
+    每个参数组合的统计口径与 StockNewHighAnalysis.new_high_next_n_days_analysis 相同，
+    按股票分块在多个进程中计算后汇总。
+
+    Args:
+        high, low, close: 日期 × 股票 的最高价、最低价、收盘价数组，缺失为 NaN
+        n_days_new_high_list: 新高天数列表
+        next_n_days_list: 新高后分析天数列表
+        n_days_next_new_high_list: 新高后忽略新高的天数列表
+        max_workers: 进程数，默认为CPU核数，1表示在当前进程中计算
+        chunk_size: 每个任务处理的股票数
+
+    Returns:
+        pd.DataFrame: 每个参数组合一行，包含新高次数、上涨概率和平均涨跌幅等
+    """
+    grid = list(itertools.product(n_days_new_high_list, next_n_days_list, n_days_next_new_high_list))
+    n_symbols = high.shape[1]
+    chunks = [slice(i, min(i + chunk_size, n_symbols)) for i in range(0, n_symbols, chunk_size)]
+    max_workers = max_workers or os.cpu_count() or 1
+
+    totals = np.zeros((len(grid), len(_STAT_NAMES)))
+    if max_workers == 1 or len(chunks) == 1:
+        for chunk in chunks:
+            totals += _backtest_chunk(high[:, chunk], low[:, chunk], close[:, chunk], grid)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(_backtest_chunk, np.array(high[:, chunk]), np.array(low[:, chunk]),
+                                np.array(close[:, chunk]), grid)
+                for chunk in chunks
+            ]
+            for future in futures:
+                totals += future.result()
+
+    stats: Dict[str, np.ndarray] = dict(zip(_STAT_NAMES, totals.T))
+    events = stats["events"]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df = pd.DataFrame({
+            '新高天数': [g[0] for g in grid],
+            '分析天数': [g[1] for g in grid],
+            '忽略新高天数': [g[2] for g in grid],
+            '新高次数': events.astype(int),
+            '上涨次数': stats["close_up"].astype(int),
+            '上涨概率': np.round(stats["close_up"] / events * 100, 2),
+            '平均涨跌幅': np.round(stats["close_sum"] / events, 2),
+            '最大涨幅为正次数': stats["high_up"].astype(int),
+            '平均最大涨幅': np.round(stats["high_sum"] / events, 2),
+            '最大跌幅为负次数': stats["low_down"].astype(int),
+            '平均最大跌幅': np.round(stats["low_sum"] / events, 2),
+        })
+    return df
+
+
+class NewHighBacktest:
+    """基于价格面板的全市场新高策略参数回测"""
+    def __init__(self, panel: Optional[PricePanelStore] = None, codes: Optional[List[str]] = None):
+        """
+        Args:
+            panel: 价格面板，默认使用 DataPathManager.BASE_PATH 下的面板
+            codes: 参与回测的股票代码，默认为面板中的全部股票
+        """
+        self.panel = panel or PricePanelStore()
+        if not self.panel.exists():
+            raise ValueError("价格面板为空，请先运行 get_history_max_price 生成面板")
+        self.codes = codes
+
+    def _get_field(self, field: str) -> np.ndarray:
+        array = self.panel.get_field(field)
+        if self.codes is None:
+            return array
+        cols = [self.panel.symbol_index(code) for code in self.codes]
+        return array[:, [col for col in cols if col is not None]]
+
+    def run(self, n_days_new_high_list: Sequence[int] = (250,), next_n_days_list: Sequence[int] = (10,),
+            n_days_next_new_high_list: Sequence[int] = (10,), max_workers: Optional[int] = None,
+            chunk_size: int = 500) -> pd.DataFrame:
+        """运行参数网格回测，参数说明见 backtest_new_high"""
+        high, low, close = (self._get_field(field) for field in ('high', 'low', 'close'))
+        n_combinations = len(n_days_new_high_list) * len(next_n_days_list) * len(n_days_next_new_high_list)
+        logger.info(f"开始回测: {high.shape[1]} 只股票, {high.shape[0]} 个交易日, {n_combinations} 组参数")
+        df = backtest_new_high(high, low, close, n_days_new_high_list, next_n_days_list,
+                               n_days_next_new_high_list, max_workers=max_workers, chunk_size=chunk_size)
+        logger.info("回测完成")
+        return df
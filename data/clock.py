@@ -0,0 +1,46 @@
+import time
+from datetime import datetime, timedelta
+from typing import Union
+
+
+class SystemClock:
+    """系统时钟"""
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def time(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class SimulatedClock:
+    """模拟时钟，用于按倍速回放
+
+    sleep 直接推进模拟时间，实际只等待 seconds / speed 秒；speed 为 0 表示不等待。
+    """
+    def __init__(self, start: Union[datetime, float], speed: float = 100.0):
+        self._now = start if isinstance(start, datetime) else datetime.fromtimestamp(start)
+        self.speed = speed
+
+    def now(self) -> datetime:
+        return self._now
+
+    def time(self) -> float:
+        return self._now.timestamp()
+
+    def advance(self, seconds: float) -> None:
+        """推进模拟时间，不等待"""
+        self._now += timedelta(seconds=seconds)
+
+    def sleep(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        if self.speed > 0:
+            time.sleep(seconds / self.speed)
+        self.advance(seconds)
+
+
+default_clock = SystemClock()
@@ -0,0 +1,296 @@
+import asyncio
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.config_manager import ConfigTools
+from data.tools import logger
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
+}
+
+
+def create_shared_session(pool_size: int = 32) -> requests.Session:
+    """创建带连接池的共享会话，所有请求复用 keep-alive 连接"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+class _SharedPoolSession(requests.Session):
+    """挂载共享会话连接池的会话，关闭时不关闭共享的连接池"""
+    def __init__(self, shared: requests.Session):
+        super().__init__()
+        self.headers.update(shared.headers)
+        for prefix, adapter in shared.adapters.items():
+            self.mount(prefix, adapter)
+
+    def close(self) -> None:
+        pass
+
+
+class SessionBoundRequests:
+    """替代第三方模块中的 requests 模块
+
+    akshare 直接调用 requests.get、requests.Session() 等，不读取任何可设置的会话；
+    把这些模块中的 requests 名称替换为本对象后，请求都经过共享会话的连接池复用 keep-alive 连接，
+    其他属性（异常类型等）仍来自 requests 模块。
+    """
+    def __init__(self, session: requests.Session):
+        self.session = session
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, params: Any = None, **kwargs: Any) -> requests.Response:
+        return self.session.get(url, params=params, **kwargs)
+
+    def post(self, url: str, data: Any = None, json: Any = None, **kwargs: Any) -> requests.Response:
+        return self.session.post(url, data=data, json=json, **kwargs)
+
+    def head(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.session.head(url, **kwargs)
+
+    def Session(self) -> requests.Session:
+        return _SharedPoolSession(self.session)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(requests, name)
+
+
+_bind_lock = threading.Lock()
+
+
+@contextmanager
+def bound_session(package: str, session: requests.Session) -> Iterator[List[str]]:
+    """在上下文内把已导入的 package 及其子模块中的 requests 替换为绑定共享会话的 SessionBoundRequests
+
+    退出时恢复为 requests 模块。嵌套使用时外层已替换的模块保持不变，由外层恢复。
+
+    Yields:
+        List[str]: 被替换的模块名
+    """
+    bound = SessionBoundRequests(session)
+    patched = []
+    with _bind_lock:
+        for name, module in list(sys.modules.items()):
+            if module is None or not (name == package or name.startswith(package + ".")):
+                continue
+            if getattr(module, "requests", None) is requests:
+                module.requests = bound
+                patched.append(module)
+    try:
+        yield [module.__name__ for module in patched]
+    finally:
+        with _bind_lock:
+            for module in patched:
+                if module.requests is bound:
+                    module.requests = requests
+
+
+class TokenBucket:
+    """令牌桶限速器，rate 为每秒补充的令牌数，capacity 为允许的突发数量"""
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        """获取一个令牌，不足时等待
+
+        令牌允许预支为负数，后来的请求按预支量排队等待，无需额外的锁。
+        """
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
+
+class FetchEngine:
+    """异步数据获取引擎
+
+    - 共享连接池会话，避免每次请求新建连接
+    - 令牌桶限速
+    - 单个任务失败后按带抖动的指数退避重试
+    - 并发上限根据错误率和延迟自适应调整（加性增、乘性减）
+    """
+    def __init__(self, rate: float = 20.0, burst: Optional[float] = None,
+                 max_concurrency: int = 32, min_concurrency: int = 2, initial_concurrency: int = 8,
+                 max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 10.0,
+                 target_latency: float = 2.0, provider=None):
+        """
+        Args:
+            rate: 每秒最多发起的请求数，0表示不限速
+            burst: 令牌桶容量，默认等于 rate
+            max_concurrency: 并发上限的最大值
+            min_concurrency: 并发上限的最小值
+            initial_concurrency: 初始并发上限
+            max_retries: 单个任务的最大重试次数
+            base_delay: 重试退避的基础等待秒数
+            max_delay: 重试退避的最大等待秒数
+            target_latency: 目标请求延迟（秒），超过两倍时降低并发
+            provider: 数据提供者，引擎运行期间使用共享会话，默认为全局数据提供者
+        """
+        self.rate_limiter = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.target_latency = target_latency
+        self.session = create_shared_session(max_concurrency)
+        self._active = 0
+        self._last_decrease = 0.0
+        self._stats = {"requests": 0, "retries": 0, "failures": 0, "latency_total": 0.0}
+        self.provider = provider
+        self._scope: Optional[ExitStack] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def from_config(cls, config: Optional[ConfigTools] = None, section: str = "Fetch.Settings",
+                    provider=None) -> "FetchEngine":
+        """从配置文件创建引擎，未配置的项使用默认值"""
+        config = config or ConfigTools()
+        kwargs = {"provider": provider}
+        for key, cast in (("rate", float), ("burst", float), ("max_concurrency", int),
+                          ("min_concurrency", int), ("initial_concurrency", int), ("max_retries", int),
+                          ("base_delay", float), ("max_delay", float), ("target_latency", float)):
+            value = config.get_config(section, key)
+            if value is not None:
+                kwargs[key] = cast(value)
+        return cls(**kwargs)
+
+    def open(self) -> "FetchEngine":
+        """开始运行：数据提供者在引擎关闭前使用共享会话，多次调用 run 复用同一个连接池、线程池和事件循环"""
+        if self._scope is None:
+            from data.providers import get_provider
+            scope = ExitStack()
+            scope.enter_context((self.provider or get_provider()).session_scope(self.session))
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+            scope.callback(self._executor.shutdown)
+            self._loop = asyncio.new_event_loop()
+            scope.callback(self._loop.close)
+            self._scope = scope
+        return self
+
+    def close(self) -> None:
+        """结束运行，关闭线程池和事件循环，数据提供者恢复原来的请求方式"""
+        if self._scope is not None:
+            scope, self._scope = self._scope, None
+            self._executor = self._loop = None
+            scope.close()
+
+    def __enter__(self) -> "FetchEngine":
+        return self.open()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def get_stats(self) -> Dict[str, float]:
+        """获取请求统计信息"""
+        requests_count = self._stats["requests"]
+        return {
+            "requests": requests_count,
+            "retries": self._stats["retries"],
+            "failures": self._stats["failures"],
+            "avg_latency": self._stats["latency_total"] / requests_count if requests_count else 0.0,
+            "concurrency": int(self.concurrency),
+        }
+
+    def _on_success(self, latency: float) -> None:
+        """成功时调整并发：延迟过高则降低，否则缓慢增加"""
+        if latency > self.target_latency * 2:
+            self._decrease()
+        elif latency <= self.target_latency:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+
+    def _decrease(self) -> None:
+        """乘性降低并发，同一时间窗口内只降低一次，避免并发的失败把上限压到最低"""
+        now = time.monotonic()
+        if now - self._last_decrease < self.target_latency:
+            return
+        self._last_decrease = now
+        self.concurrency = max(self.min_concurrency, self.concurrency * 0.7)
+        logger.info(f"请求出错或延迟过高，并发上限降低至 {int(self.concurrency)}")
+
+    def _backoff(self, attempt: int) -> float:
+        """带抖动的指数退避时间"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def _fetch_one(self, key: Any, func: Callable,
+                         condition: asyncio.Condition) -> Tuple[Any, Any, Optional[Exception]]:
+        loop = asyncio.get_running_loop()
+        error = None
+        for attempt in range(self.max_retries + 1):
+            async with condition:
+                await condition.wait_for(lambda: self._active < int(self.concurrency))
+                self._active += 1
+            try:
+                await self.rate_limiter.acquire()
+                start = time.monotonic()
+                result = await loop.run_in_executor(self._executor, partial(func, key))
+                latency = time.monotonic() - start
+                self._stats["requests"] += 1
+                self._stats["latency_total"] += latency
+                self._on_success(latency)
+                return key, result, None
+            except Exception as e:
+                error = e
+                self._stats["requests"] += 1
+                self._decrease()
+            finally:
+                async with condition:
+                    self._active -= 1
+                    condition.notify_all()
+
+            if attempt < self.max_retries:
+                self._stats["retries"] += 1
+                delay = self._backoff(attempt)
+                logger.warning(f"获取 {key} 失败，{delay:.1f}秒后第{attempt + 1}次重试: {str(error)}")
+                await asyncio.sleep(delay)
+
+        self._stats["failures"] += 1
+        return key, None, error
+
+    async def _run(self, keys: Iterable[Any], func: Callable) -> Tuple[Dict[Any, Any], Dict[Any, Exception]]:
+        condition = asyncio.Condition()
+        results: Dict[Any, Any] = {}
+        failures: Dict[Any, Exception] = {}
+        tasks = [self._fetch_one(key, func, condition) for key in keys]
+        for key, result, error in await asyncio.gather(*tasks):
+            if error is not None:
+                failures[key] = error
+            else:
+                results[key] = result
+        return results, failures
+
+    def run(self, keys: Iterable[Any], func: Callable[[Any], Any]) -> Tuple[Dict[Any, Any], Dict[Any, Exception]]:
+        """对每个 key 调用 func(key)，返回 (成功结果, 重试后仍失败的异常)
+
+        func 为阻塞函数，在线程池中执行；抛出异常即视为失败并触发重试。
+        引擎未打开时只在本次调用期间打开。
+        """
+        if self._scope is None:
+            with self:
+                return self._loop.run_until_complete(self._run(list(keys), func))
+        return self._loop.run_until_complete(self._run(list(keys), func))
+
@@ -0,0 +1,75 @@
+import re
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+
+_WINDOW_COLUMN = re.compile(r'^(\d+)日最高$')
+
+
+class HistoryIndex:
+    """按股票代码索引的历史最高价数据
+
+    历史数据在交易日内不变，每个交易日只构建一次；每次检查只需把实时快照按代码对齐，
+    不再重复读取缓存和执行 pd.merge。
+    """
+    def __init__(self, max_price_df: pd.DataFrame, trade_date: str, code_column: str = '股票代码'):
+        """
+        Args:
+            max_price_df: get_history_max_price 返回的数据
+            trade_date: 历史数据对应的交易日
+            code_column: 股票代码列名
+        """
+        df = max_price_df.copy()
+        df[code_column] = df[code_column].astype(str)
+        df = df.drop_duplicates(code_column, keep='last').reset_index(drop=True)
+        for col in df.columns:
+            if (col == '历史最高' or _WINDOW_COLUMN.match(str(col))) and not pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+
+        self.trade_date = trade_date
+        self.code_column = code_column
+        self.frame = df
+        self.codes = pd.Index(df[code_column], dtype=object)
+        self._values = {}
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __contains__(self, code: str) -> bool:
+        return str(code) in self.codes
+
+    @property
+    def empty(self) -> bool:
+        return len(self.codes) == 0
+
+    @property
+    def windows(self) -> List[int]:
+        """历史数据中包含的新高窗口（N日最高 列），升序"""
+        return sorted(int(m.group(1)) for m in map(_WINDOW_COLUMN.match, self.frame.columns) if m)
+
+    def values(self, column: str) -> np.ndarray:
+        """数值列的数组（按索引顺序），首次访问时转换并缓存"""
+        if column not in self._values:
+            self._values[column] = pd.to_numeric(self.frame[column], errors='coerce').to_numpy(dtype=np.float64)
+        return self._values[column]
+
+    def positions(self, codes: Sequence[str]) -> np.ndarray:
+        """股票代码在索引中的行号，不存在的为 -1"""
+        return self.codes.get_indexer(pd.Index(codes, dtype=object).astype(str))
+
+    def align(self, spot_df: pd.DataFrame) -> pd.DataFrame:
+        """把实时快照与历史数据按股票代码对齐
+
+        结果与 pd.merge(历史数据, spot_df, on=股票代码, how='inner') 的列相同，行按快照顺序排列。
+        """
+        positions = self.positions(spot_df[self.code_column])
+        matched = positions >= 0
+        left = self.frame.iloc[positions[matched]].reset_index(drop=True)
+        right = spot_df.loc[matched].drop(columns=[self.code_column]).reset_index(drop=True)
+        # 与历史数据重名的列沿用 pd.merge 的后缀规则
+        overlap = left.columns.intersection(right.columns).drop(self.code_column, errors='ignore')
+        if len(overlap):
+            left = left.rename(columns={col: f"{col}_x" for col in overlap})
+            right = right.rename(columns={col: f"{col}_y" for col in overlap})
+        return pd.concat([left, right], axis=1)
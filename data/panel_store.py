@@ -0,0 +1,281 @@
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from data.tools import DataPathManager, logger
+
+
+class PricePanelStore:
+    """全市场日线面板存储
+
+    每个字段保存为一个 日期 × 股票 的连续数组（.npy，内存映射读取），
+    另有 meta.json 记录股票代码与交易日期索引，数组中超出索引的行列为预留容量。
+    日期按行存储，新交易日直接追加到已预留的行中，无需重写整个文件。
+    """
+    # 面板字段 -> 历史数据中的列名
+    FIELDS = {
+        "open": "开盘",
+        "close": "收盘",
+        "high": "最高",
+        "low": "最低",
+        "amount": "成交额",
+        "turnover": "换手率",
+    }
+    DTYPE = np.float32
+    META_FILE = "meta.json"
+
+    def __init__(self, path: Optional[Union[str, Path]] = None, fields: Optional[List[str]] = None):
+        """
+        Args:
+            path: 面板存储目录，默认为 DataPathManager.BASE_PATH/price_panel
+            fields: 需要存储的字段，默认为 FIELDS 中的全部字段
+        """
+        self.path = Path(path) if path else DataPathManager.BASE_PATH / "price_panel"
+        self.fields = fields or list(self.FIELDS.keys())
+        self._lock = threading.RLock()
+        self._arrays: Dict[str, np.memmap] = {}
+        self._symbols: List[str] = []
+        self._dates: List[str] = []
+        self._symbol_index: Dict[str, int] = {}
+        self._date_index: Dict[str, int] = {}
+        self._dirty = False
+        self._load()
+
+    @staticmethod
+    def normalize_date(date: object) -> str:
+        """统一日期格式为 YYYY-MM-DD"""
+        return pd.Timestamp(str(date)).strftime('%Y-%m-%d')
+
+    @property
+    def symbols(self) -> List[str]:
+        return self._symbols
+
+    @property
+    def dates(self) -> List[str]:
+        return self._dates
+
+    @property
+    def last_date(self) -> Optional[str]:
+        return self._dates[-1] if self._dates else None
+
+    def exists(self) -> bool:
+        """面板是否已有数据"""
+        return bool(self._dates) and bool(self._symbols)
+
+    def is_current(self, trade_date: str) -> bool:
+        """面板是否已包含指定交易日的数据"""
+        return self.exists() and self.last_date == self.normalize_date(trade_date)
+
+    def is_symbol_current(self, code: str, trade_date: str) -> bool:
+        """股票在指定交易日是否已有数据（停牌股票返回False）"""
+        col = self._symbol_index.get(str(code))
+        if col is None or not self.is_current(trade_date):
+            return False
+        return not np.isnan(self._arrays["high" if "high" in self.fields else self.fields[0]][len(self._dates) - 1, col])
+
+    def symbol_index(self, code: str) -> Optional[int]:
+        return self._symbol_index.get(str(code))
+
+    def date_index(self, date: object) -> Optional[int]:
+        return self._date_index.get(self.normalize_date(date))
+
+    def _field_file(self, field: str) -> Path:
+        return self.path / f"{field}.npy"
+
+    def _load(self) -> None:
+        """加载索引并以内存映射方式打开各字段数组"""
+        meta_file = self.path / self.META_FILE
+        if not meta_file.exists():
+            return
+        try:
+            with open(meta_file, "r", encoding='utf-8') as f:
+                meta = json.load(f)
+            self._symbols = meta["symbols"]
+            self._dates = meta["dates"]
+            self._symbol_index = {code: i for i, code in enumerate(self._symbols)}
+            self._date_index = {date: i for i, date in enumerate(self._dates)}
+            for field in self.fields:
+                self._arrays[field] = np.load(self._field_file(field), mmap_mode='r+')
+        except Exception as e:
+            logger.warning(f"加载价格面板失败，将重新构建: {str(e)}")
+            self._arrays, self._symbols, self._dates = {}, [], []
+            self._symbol_index, self._date_index = {}, {}
+
+    def _allocate(self, date_capacity: int, symbol_capacity: int) -> Dict[str, np.memmap]:
+        """按容量重新创建数组文件，并拷贝已有数据"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        n_dates, n_symbols = len(self._dates), len(self._symbols)
+        arrays = {}
+        for field in self.fields:
+            # 先把已有数据读入内存并释放映射，才能覆盖同名文件
+            old = self._arrays.pop(field, None)
+            existing = np.array(old[:n_dates, :n_symbols]) if old is not None else None
+            del old
+            array = np.lib.format.open_memmap(
+                self._field_file(field), mode='w+', dtype=self.DTYPE, shape=(date_capacity, symbol_capacity)
+            )
+            array[:] = np.nan
+            if existing is not None:
+                array[:n_dates, :n_symbols] = existing
+            arrays[field] = array
+        return arrays
+
+    def _ensure_capacity(self, n_dates: int, n_symbols: int) -> None:
+        """确保数组容量足够，不足时按两倍扩容"""
+        if self._arrays:
+            date_capacity, symbol_capacity = next(iter(self._arrays.values())).shape
+        else:
+            date_capacity, symbol_capacity = 0, 0
+        if n_dates <= date_capacity and n_symbols <= symbol_capacity:
+            return
+        new_date_capacity = max(n_dates, date_capacity * 2, 256)
+        new_symbol_capacity = max(n_symbols, symbol_capacity * 2, 64)
+        self._arrays = self._allocate(new_date_capacity, new_symbol_capacity)
+
+    def reserve_symbols(self, n_symbols: int) -> None:
+        """预先分配 n_symbols 只股票的容量，全市场扫描前调用，避免逐只添加时反复扩容"""
+        with self._lock:
+            self._ensure_capacity(len(self._dates), n_symbols)
+
+    def _add_symbol(self, code: str) -> int:
+        self._ensure_capacity(len(self._dates), len(self._symbols) + 1)
+        self._symbols.append(code)
+        self._symbol_index[code] = len(self._symbols) - 1
+        self._dirty = True
+        return self._symbol_index[code]
+
+    def _add_dates(self, dates: List[str]) -> None:
+        """添加新的交易日，晚于最后日期的直接追加，否则重排已有行"""
+        new_dates = sorted(set(dates) - set(self._date_index))
+        if not new_dates:
+            return
+        if not self._dates or new_dates[0] > self._dates[-1]:
+            self._ensure_capacity(len(self._dates) + len(new_dates), len(self._symbols))
+            for date in new_dates:
+                self._date_index[date] = len(self._dates)
+                self._dates.append(date)
+        else:
+            # 插入历史日期（例如新股票带来更早的数据），需要重排行顺序
+            all_dates = sorted(set(self._dates) | set(new_dates))
+            self._ensure_capacity(len(all_dates), len(self._symbols))
+            positions = {date: i for i, date in enumerate(all_dates)}
+            new_rows = np.array([positions[d] for d in self._dates], dtype=np.int64)
+            n_symbols = len(self._symbols)
+            for array in self._arrays.values():
+                old = np.array(array[:len(self._dates), :n_symbols])
+                array[:len(all_dates), :n_symbols] = np.nan
+                array[new_rows, :n_symbols] = old
+            self._dates = all_dates
+            self._date_index = {date: i for i, date in enumerate(self._dates)}
+        self._dirty = True
+
+    def write_history(self, code: str, df: pd.DataFrame) -> None:
+        """写入（覆盖）单个股票的历史日线数据
+
+        Args:
+            code: 股票代码
+            df: 历史数据，需包含 '日期' 列及 FIELDS 中对应的价格列
+        """
+        if df is None or df.empty:
+            return
+        code = str(code)
+        # 整列统一转换日期格式，与 normalize_date 结果相同
+        dates = pd.to_datetime(df['日期'].astype(str)).dt.strftime('%Y-%m-%d').to_numpy()
+        with self._lock:
+            self._add_dates(pd.unique(dates).tolist())
+            col = self._symbol_index.get(code)
+            if col is None:
+                col = self._add_symbol(code)
+            rows = pd.Index(self._dates).get_indexer(dates)
+            for field in self.fields:
+                column = self.FIELDS[field]
+                if column not in df.columns:
+                    continue
+                values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=self.DTYPE)
+                self._arrays[field][rows, col] = values
+            self._dirty = True
+
+    def append_date(self, date: object, df: pd.DataFrame, code_column: str = '股票代码') -> None:
+        """追加一个交易日的全市场数据（例如收盘后的实时行情快照）
+
+        Args:
+            date: 交易日期
+            df: 每行一只股票，包含代码列及 FIELDS 中对应的价格列
+            code_column: 股票代码列名
+        """
+        date = self.normalize_date(date)
+        with self._lock:
+            self._add_dates([date])
+            row = self._date_index[date]
+            codes = df[code_column].astype(str).tolist()
+            cols = np.array([
+                self._symbol_index[c] if c in self._symbol_index else self._add_symbol(c) for c in codes
+            ], dtype=np.int64)
+            for field in self.fields:
+                column = self.FIELDS[field]
+                if column not in df.columns:
+                    continue
+                self._arrays[field][row, cols] = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=self.DTYPE)
+            self._dirty = True
+
+    def flush(self) -> None:
+        """将数组和索引写回磁盘"""
+        with self._lock:
+            if not self._dirty:
+                return
+            for array in self._arrays.values():
+                array.flush()
+            meta_file = self.path / self.META_FILE
+            tmp_file = meta_file.with_suffix(".tmp")
+            with open(tmp_file, "w", encoding='utf-8') as f:
+                json.dump({"symbols": self._symbols, "dates": self._dates}, f, ensure_ascii=False)
+            tmp_file.replace(meta_file)
+            self._dirty = False
+            logger.info(f"价格面板已保存: {len(self._dates)} 个交易日, {len(self._symbols)} 只股票")
+
+    def get_field(self, field: str, last_n: Optional[int] = None,
+                  start_date: Optional[object] = None, end_date: Optional[object] = None) -> np.ndarray:
+        """获取字段的 日期 × 股票 数组切片（内存映射视图，不拷贝）
+
+        Args:
+            field: 字段名，见 FIELDS
+            last_n: 只取最近 last_n 个交易日
+            start_date: 起始日期（包含）
+            end_date: 结束日期（包含）
+        """
+        n_dates, n_symbols = len(self._dates), len(self._symbols)
+        start, end = 0, n_dates
+        if start_date is not None:
+            start = int(np.searchsorted(self._dates, self.normalize_date(start_date), side='left'))
+        if end_date is not None:
+            end = int(np.searchsorted(self._dates, self.normalize_date(end_date), side='right'))
+        if last_n is not None:
+            start = max(start, end - last_n)
+        return self._arrays[field][start:end, :n_symbols]
+
+    def get_dates(self, last_n: Optional[int] = None) -> List[str]:
+        """获取与 get_field(last_n=...) 对应的日期列表"""
+        return self._dates[-last_n:] if last_n else list(self._dates)
+
+    def get_symbol(self, code: str, field: str, last_n: Optional[int] = None) -> Optional[np.ndarray]:
+        """获取单个股票某字段的时间序列（视图），股票不存在时返回None"""
+        col = self._symbol_index.get(str(code))
+        if col is None:
+            return None
+        return self.get_field(field, last_n=last_n)[:, col]
+
+    def get_symbol_frame(self, code: str, last_n: Optional[int] = None) -> pd.DataFrame:
+        """以历史数据的列名组装单个股票的DataFrame，剔除无数据的交易日"""
+        col = self._symbol_index.get(str(code))
+        if col is None:
+            return pd.DataFrame()
+        data = {'日期': self.get_dates(last_n)}
+        for field in self.fields:
+            data[self.FIELDS[field]] = self.get_field(field, last_n=last_n)[:, col]
+        df = pd.DataFrame(data)
+        price_columns = [self.FIELDS[field] for field in self.fields]
+        return df.dropna(how='all', subset=price_columns).reset_index(drop=True)
@@ -0,0 +1,298 @@
+import random
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.config_manager import ConfigTools
+from data.tools import DataPathManager, logger
+
+# 日线历史数据的列，与 akshare stock_zh_a_hist 一致
+HISTORY_COLUMNS = ['日期', '股票代码', '开盘', '收盘', '最高', '最低', '成交量', '成交额', '振幅', '涨跌幅', '涨跌额', '换手率']
+# 实时行情的列，与 akshare stock_zh_a_spot_em 一致的主要字段
+SPOT_COLUMNS = ['序号', '代码', '名称', '最新价', '涨跌幅', '涨跌额', '成交量', '成交额', '振幅', '最高', '最低',
+                '今开', '昨收', '量比', '换手率', '市盈率-动态', '市净率', '总市值', '流通市值']
+
+
+class MarketDataProvider(ABC):
+    """行情数据提供者接口，所有外部数据访问都通过该接口"""
+    # 非空时使用 DataPathManager.BASE_PATH 下的子目录作为缓存目录，避免与真实数据混在一起
+    DATA_SUBDIR = ""
+
+    @abstractmethod
+    def get_stock_list(self) -> pd.DataFrame:
+        """股票列表，包含 code、name 列"""
+
+    @abstractmethod
+    def get_daily_history(self, code: str, start_date: str, end_date: str, adjust: str = "qfq") -> pd.DataFrame:
+        """单个股票的日线历史数据，列见 HISTORY_COLUMNS，日期格式 YYYYMMDD"""
+
+    @abstractmethod
+    def get_spot(self) -> pd.DataFrame:
+        """全市场实时行情快照，列见 SPOT_COLUMNS"""
+
+    @abstractmethod
+    def get_trade_calendar(self, market: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """交易日历，索引为交易日，包含带时区的 market_open、market_close 列"""
+
+    def session_scope(self, session) -> ContextManager:
+        """在上下文内使用共享的HTTP会话，退出时恢复，不使用HTTP的提供者忽略"""
+        return nullcontext()
+
+
+class AkshareProvider(MarketDataProvider):
+    """基于 akshare 和 pandas_market_calendars 的在线数据"""
+    def __init__(self):
+        import akshare
+        self._ak = akshare
+
+    def get_stock_list(self) -> pd.DataFrame:
+        return self._ak.stock_info_a_code_name()
+
+    def get_daily_history(self, code: str, start_date: str, end_date: str, adjust: str = "qfq") -> pd.DataFrame:
+        return self._ak.stock_zh_a_hist(
+            symbol=code,
+            period="daily",
+            start_date=start_date,
+            end_date=end_date,
+            adjust=adjust
+        )
+
+    def get_spot(self) -> pd.DataFrame:
+        return self._ak.stock_zh_a_spot_em()
+
+    def get_trade_calendar(self, market: str, start_date: str, end_date: str) -> pd.DataFrame:
+        from pandas_market_calendars import get_calendar
+        return get_calendar(market).schedule(start_date=start_date, end_date=end_date)
+
+    @contextmanager
+    def session_scope(self, session) -> Iterator[None]:
+        # akshare 各模块直接调用 requests.get / requests.Session()，上下文内替换这些模块中的 requests 使其复用连接池
+        from data.fetch_engine import bound_session
+        with bound_session(self._ak.__name__, session) as patched:
+            if not patched:
+                logger.warning("akshare 模块中没有找到 requests，共享连接池未生效")
+            yield
+
+
+class SyntheticProvider(MarketDataProvider):
+    """离线的确定性模拟数据，用于在没有网络的机器上测试和压测
+
+    价格为以股票代码为种子的随机游走，相同参数下结果完全一致；
+    可配置每次调用的延迟和出错概率，用于测试获取引擎、缓存和监控循环。
+    """
+    DATA_SUBDIR = "synthetic"
+    EPOCH = pd.Timestamp("2010-01-04")
+
+    def __init__(self, universe_size: int = 5000, latency: float = 0.0, error_rate: float = 0.0,
+                 seed: int = 0, clock=None):
+        """
+        Args:
+            universe_size: 股票数量
+            latency: 每次调用的模拟延迟（秒）
+            error_rate: 每次调用抛出 ConnectionError 的概率
+            seed: 随机种子
+            clock: 时钟，决定实时行情的时间，默认为系统时钟
+        """
+        from data.clock import default_clock
+        self.universe_size = universe_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.clock = clock or default_clock
+        self._error_random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._intraday_cache: Dict[str, tuple] = {}
+        self._epoch_days: Optional[pd.DatetimeIndex] = None
+        self._epoch_dates: Optional[np.ndarray] = None
+        self.call_count = 0
+
+        prefixes = ['60', '00', '30', '68']
+        self._codes = [f"{prefixes[i % 4]}{i // 4:04d}" for i in range(universe_size)]
+        self._names = [f"模拟{i:05d}" for i in range(universe_size)]
+        rng = np.random.default_rng(seed)
+        self._float_shares = rng.uniform(1e8, 5e9, universe_size)
+
+    def _simulate_call(self) -> None:
+        """模拟网络延迟和随机错误"""
+        with self._lock:
+            self.call_count += 1
+            failed = self._error_random.random() < self.error_rate
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if failed:
+            raise ConnectionError("模拟的接口错误")
+
+    def _trading_days(self, start: pd.Timestamp, end: pd.Timestamp) -> pd.DatetimeIndex:
+        return pd.bdate_range(start, end)
+
+    def _days_since_epoch(self, end: pd.Timestamp) -> Tuple[pd.DatetimeIndex, np.ndarray]:
+        """EPOCH 到 end 的交易日及对应的 date 数组
+
+        日期索引每个提供者只生成一次，end 超出时多延长一年，每只股票只做切片。
+        """
+        with self._lock:
+            if self._epoch_days is None or self._epoch_days[-1] < end:
+                self._epoch_days = self._trading_days(self.EPOCH, end + pd.DateOffset(years=1))
+                self._epoch_dates = self._epoch_days.date
+            days, dates = self._epoch_days, self._epoch_dates
+        n = days.searchsorted(end, side='right')
+        return days[:n], dates[:n]
+
+    def _field_rng(self, code: str, field: int) -> np.random.Generator:
+        """每只股票的每个字段使用独立的随机数序列
+
+        序列按日期顺序消耗，长度为 n 的结果是更长结果的前缀，因此不同结束日期获取的数据在重叠的日期上完全一致。
+        """
+        return np.random.default_rng([self.seed, zlib.crc32(code.encode()), field])
+
+    def _close_path(self, code: str, n: int) -> np.ndarray:
+        """从 EPOCH 开始 n 个交易日的收盘价"""
+        scale = self._field_rng(code, 0).uniform(0.5, 5)
+        returns = self._field_rng(code, 1).normal(0.0003, 0.02, n)
+        return 10 * np.exp(np.cumsum(returns)) * scale
+
+    def _price_path(self, code: str, end: pd.Timestamp) -> pd.DataFrame:
+        """从 EPOCH 到 end 的完整日线，保证任意起始日期截取的结果一致"""
+        days, dates = self._days_since_epoch(end)
+        n = len(days)
+        close = self._close_path(code, n)
+        open_ = close * np.exp(self._field_rng(code, 2).normal(0, 0.005, n))
+        high = np.maximum(open_, close) * (1 + np.abs(self._field_rng(code, 3).normal(0, 0.01, n)))
+        low = np.minimum(open_, close) * (1 - np.abs(self._field_rng(code, 4).normal(0, 0.01, n)))
+        volume = self._field_rng(code, 5).integers(10_000, 1_000_000, n)
+        prev_close = np.concatenate([[close[0]], close[:-1]])
+        return pd.DataFrame({
+            '日期': dates.copy(),
+            '股票代码': code,
+            '开盘': open_.round(2),
+            '收盘': close.round(2),
+            '最高': high.round(2),
+            '最低': low.round(2),
+            '成交量': volume,
+            '成交额': (volume * close * 100).round(2),
+            '振幅': ((high - low) / prev_close * 100).round(2),
+            '涨跌幅': ((close / prev_close - 1) * 100).round(2),
+            '涨跌额': (close - prev_close).round(2),
+            '换手率': (self._field_rng(code, 6).uniform(0.1, 10, n)).round(2),
+        })
+
+    def get_stock_list(self) -> pd.DataFrame:
+        self._simulate_call()
+        return pd.DataFrame({'code': self._codes, 'name': self._names})
+
+    def get_daily_history(self, code: str, start_date: str, end_date: str, adjust: str = "qfq") -> pd.DataFrame:
+        self._simulate_call()
+        df = self._price_path(code, pd.Timestamp(end_date))
+        return df[df['日期'] >= pd.Timestamp(start_date).date()].reset_index(drop=True)
+
+    def _intraday(self, day: pd.Timestamp) -> tuple:
+        """当日所有股票按分钟的价格路径和累计最高、最低价，每天计算一次
+
+        昨收为日线中前一交易日的收盘价，分钟路径收于日线中当日的收盘价。
+        """
+        key = day.strftime('%Y%m%d')
+        if key not in self._intraday_cache:
+            n_days = len(self._days_since_epoch(day)[0])
+            closes = np.array([self._close_path(code, n_days)[-2:] for code in self._codes]).round(2)
+            prev_close, close = closes[:, 0], closes[:, 1]
+            rng = np.random.default_rng([self.seed, int(key)])
+            minutes = 241
+            # 布朗桥：随机游走的终点调整到当日收盘价
+            walk = np.cumsum(rng.normal(0, 0.002, (minutes, self.universe_size)), axis=0)
+            progress = np.arange(1, minutes + 1)[:, None] / minutes
+            path = prev_close * np.exp(walk - progress * (walk[-1] - np.log(close / prev_close)))
+            self._intraday_cache = {key: (prev_close, path, np.maximum.accumulate(path), np.minimum.accumulate(path))}
+        return self._intraday_cache[key]
+
+    def get_spot(self) -> pd.DataFrame:
+        self._simulate_call()
+        now = pd.Timestamp(self.clock.now())
+        day = now.normalize()
+        if day.dayofweek >= 5:
+            day = self._trading_days(day - pd.Timedelta(days=7), day)[-1]
+            now = day + pd.Timedelta(hours=15)
+        prev_close, path, high, low = self._intraday(day)
+        # 9:30-11:30 与 13:00-15:00 共 240 分钟
+        minute_of_day = now.hour * 60 + now.minute
+        if minute_of_day < 9 * 60 + 30:
+            minute = 0
+        elif minute_of_day <= 11 * 60 + 30:
+            minute = minute_of_day - (9 * 60 + 30)
+        elif minute_of_day < 13 * 60:
+            minute = 120
+        else:
+            minute = min(120 + minute_of_day - 13 * 60, 240)
+
+        price = path[minute].round(2)
+        circulating = self._float_shares * price
+        return pd.DataFrame({
+            '序号': np.arange(1, self.universe_size + 1),
+            '代码': self._codes,
+            '名称': self._names,
+            '最新价': price,
+            '涨跌幅': ((price / prev_close - 1) * 100).round(2),
+            '涨跌额': (price - prev_close).round(2),
+            '成交量': (self._float_shares * 0.0001 * (minute + 1)).round(),
+            '成交额': (self._float_shares * 0.0001 * (minute + 1) * price).round(2),
+            '振幅': ((high[minute] - low[minute]) / prev_close * 100).round(2),
+            '最高': high[minute].round(2),
+            '最低': low[minute].round(2),
+            '今开': path[0].round(2),
+            '昨收': prev_close,
+            '量比': 1.0,
+            '换手率': 1.0,
+            '市盈率-动态': 20.0,
+            '市净率': 2.0,
+            '总市值': (circulating * 1.2).round(2),
+            '流通市值': circulating.round(2),
+        })
+
+    def get_trade_calendar(self, market: str, start_date: str, end_date: str) -> pd.DataFrame:
+        self._simulate_call()
+        days = self._trading_days(pd.Timestamp(start_date), pd.Timestamp(end_date))
+        local_days = days.tz_localize("Asia/Shanghai")
+        return pd.DataFrame({
+            'market_open': (local_days + pd.Timedelta(hours=9, minutes=30)).tz_convert("UTC"),
+            'market_close': (local_days + pd.Timedelta(hours=15)).tz_convert("UTC"),
+        }, index=days)
+
+
+_provider: Optional[MarketDataProvider] = None
+_provider_lock = threading.Lock()
+
+
+def set_provider(provider: MarketDataProvider) -> None:
+    """设置全局数据提供者，模拟数据使用单独的缓存目录"""
+    global _provider
+    with _provider_lock:
+        if provider.DATA_SUBDIR and DataPathManager.BASE_PATH.name != provider.DATA_SUBDIR:
+            DataPathManager.BASE_PATH = DataPathManager.BASE_PATH / provider.DATA_SUBDIR
+        _provider = provider
+
+
+def get_provider() -> MarketDataProvider:
+    """获取全局数据提供者，首次调用时按配置 [Provider.Settings] 创建，默认为 akshare"""
+    if _provider is None:
+        config = ConfigTools()
+        name = config.get_config("Provider.Settings", "name", "akshare")
+        if name == "synthetic":
+            provider = SyntheticProvider(
+                universe_size=int(config.get_config("Provider.Settings", "universe_size", 5000)),
+                latency=float(config.get_config("Provider.Settings", "latency", 0.0)),
+                error_rate=float(config.get_config("Provider.Settings", "error_rate", 0.0)),
+                seed=int(config.get_config("Provider.Settings", "seed", 0)),
+            )
+        elif name == "akshare":
+            provider = AkshareProvider()
+        else:
+            raise ValueError(f"不支持的数据提供者: {name}")
+        logger.info(f"使用数据提供者: {name}")
+        set_provider(provider)
+    return _provider
+
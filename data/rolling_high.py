@@ -0,0 +1,391 @@
+import json
+from collections import deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from data.tools import DataPathManager, logger
+
+if TYPE_CHECKING:
+    from data.panel_store import PricePanelStore
+
+
+def window_columns(window: int) -> Tuple[str, str, str]:
+    """窗口最高价结果的列名：(最高价, 最高价日期, 距今交易日数)"""
+    return f'{window}日最高', f'{window}日最高日期', f'{window}日距今交易日数'
+
+
+def trailing_highs(high: np.ndarray, windows: Sequence[int]) -> Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """一次遍历计算所有股票在多个窗口内的最高价
+
+    停牌和未上市的日期在面板中为 NaN，窗口按每只股票自己的有效K线计数，
+    与逐只股票取最后 k 行数据的结果一致。
+
+    从最后一行向前累计最大值，最近 k 根有效K线的最高价即为第 k 根有效K线处的累计值，
+    因此任意多个窗口只需一次累计，再按各窗口的起点取值。
+
+    Args:
+        high: 日期 × 股票 的最高价数组，日期升序
+        windows: 窗口长度列表（有效K线数）
+
+    Returns:
+        dict: 窗口长度到 (窗口最高价, 最高价所在行号, 距今交易日数) 的映射，每个数组长度均为股票数；
+            没有任何有效数据的股票最高价为 NaN，行号和距今交易日数为 -1
+    """
+    high = np.asarray(high, dtype=np.float64)
+    n_rows, n_cols = high.shape
+    columns = np.arange(n_cols)
+    valid = ~np.isnan(high)
+
+    # 反向后第 r 行的累计最大值及其位置；相同价格取反向后较大的行号，即原顺序中较早的K线
+    reversed_high = np.where(valid, high, -np.inf)[::-1]
+    running_max = np.maximum.accumulate(reversed_high, axis=0)
+    rows = np.arange(n_rows)[:, None]
+    running_row = np.maximum.accumulate(np.where(reversed_high == running_max, rows, -1), axis=0)
+    # 反向后每行（含）之前的有效K线数
+    valid_count = np.cumsum(valid[::-1], axis=0)
+    total_valid = valid_count[-1] if n_rows else np.zeros(n_cols, dtype=np.int64)
+
+    results = {}
+    for window in windows:
+        window = int(window)
+        has_data = total_valid > 0
+        # 窗口起点：第 min(window, 有效K线数) 根有效K线
+        target = np.minimum(window, total_valid)
+        start = (valid_count >= np.maximum(target, 1)).argmax(axis=0) if n_rows else np.zeros(n_cols, dtype=np.int64)
+        max_price = running_max[start, columns] if n_rows else np.full(n_cols, np.nan)
+        reversed_row = running_row[start, columns] if n_rows else np.zeros(n_cols, dtype=np.int64)
+        max_row = n_rows - 1 - reversed_row
+        days_since_max = valid_count[np.maximum(reversed_row, 0), columns] if n_rows else np.zeros(n_cols, dtype=np.int64)
+        results[window] = (
+            np.where(has_data, max_price, np.nan),
+            np.where(has_data, max_row, -1),
+            np.where(has_data, days_since_max, -1),
+        )
+    return results
+
+
+def _rolling_max_filled(values: np.ndarray, window: int) -> np.ndarray:
+    """沿第0轴的滚动最大值（van Herk/Gil-Werman 分块算法，与窗口长度无关的 O(N)）
+
+    输入中缺失值须已填充为 -inf，前 window-1 行结果为 -inf。
+    """
+    n_rows, window = values.shape[0], int(window)
+    out = np.full(values.shape, -np.inf)
+    if window <= 1:
+        return values.copy()
+    if n_rows < window:
+        return out
+    pad = (-n_rows) % window
+    padded = np.concatenate([values, np.full((pad,) + values.shape[1:], -np.inf)])
+    blocks = padded.reshape((-1, window) + values.shape[1:])
+    prefix = np.maximum.accumulate(blocks, axis=1).reshape(padded.shape)
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(padded.shape)
+    # 以 i 结尾的窗口从 i-window+1 开始，最多跨越两个块
+    out[window - 1:] = np.maximum(suffix[:n_rows - window + 1], prefix[window - 1:n_rows])
+    return out
+
+
+def rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    """以每行为结尾、长度为 window 的滚动最大值，忽略 NaN
+
+    Args:
+        values: 一维序列或 日期 × 股票 的二维数组
+        window: 窗口长度
+
+    Returns:
+        np.ndarray: 与输入形状相同，前 window-1 行及窗口内全部缺失时为 NaN
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = _rolling_max_filled(np.where(np.isnan(values), -np.inf, values), window)
+    result[np.isneginf(result)] = np.nan
+    return result
+
+
+def forward_max(values: np.ndarray, window: int) -> np.ndarray:
+    """以每行为起点、向后 window 行（含当行，末尾不足时截断）的最大值，忽略 NaN"""
+    values, window = np.asarray(values, dtype=np.float64), int(window)
+    filled = np.where(np.isnan(values), -np.inf, values)[::-1]
+    padded = np.concatenate([np.full((window - 1,) + filled.shape[1:], -np.inf), filled])
+    result = _rolling_max_filled(padded, window)[window - 1:][::-1]
+    result[np.isneginf(result)] = np.nan
+    return result
+
+
+def forward_min(values: np.ndarray, window: int) -> np.ndarray:
+    """以每行为起点、向后 window 行（含当行，末尾不足时截断）的最小值，忽略 NaN"""
+    return -forward_max(-np.asarray(values, dtype=np.float64), window)
+
+
+def select_with_cooldown(candidates: np.ndarray, cooldown: int) -> np.ndarray:
+    """按冷却期筛选事件：选中一个事件后，之后 cooldown 行内的事件忽略
+
+    Args:
+        candidates: 一维布尔数组，True 表示该行满足条件
+        cooldown: 冷却行数，下一个事件至少在 cooldown+1 行之后
+
+    Returns:
+        np.ndarray: 选中事件的行号
+    """
+    positions = np.flatnonzero(candidates)
+    selected = []
+    i = 0
+    while i < len(positions):
+        position = positions[i]
+        selected.append(position)
+        # 只在候选事件之间跳转，事件数远小于行数
+        i = int(np.searchsorted(positions, position + cooldown + 1, side='left'))
+    return np.asarray(selected, dtype=np.int64)
+
+
+class RollingHighState:
+    """单个股票滚动窗口最高价的增量状态
+
+    用单调递减队列保存窗口内可能成为最高价的K线，每根新K线的更新为均摊 O(1)。
+    相同价格保留较早的K线，与 pandas idxmax 取第一个最大值一致。
+    """
+    __slots__ = ("window", "bar_count", "last_date", "last_high", "queue")
+
+    def __init__(self, window: int, bar_count: int = 0, last_date: Optional[str] = None,
+                 last_high: Optional[float] = None, queue: Optional[List[list]] = None):
+        self.window = window
+        self.bar_count = bar_count
+        self.last_date = last_date
+        self.last_high = last_high
+        # 队列元素为 [K线序号, 日期, 最高价]
+        self.queue = deque(queue or [])
+
+    def update(self, date: str, high: float) -> None:
+        """追加一根新K线"""
+        index = self.bar_count
+        while self.queue and self.queue[-1][2] < high:
+            self.queue.pop()
+        self.queue.append([index, date, high])
+        while self.queue[0][0] <= index - self.window:
+            self.queue.popleft()
+        self.bar_count += 1
+        self.last_date = date
+        self.last_high = high
+
+    @property
+    def max_high(self) -> float:
+        return self.queue[0][2] if self.queue else float('nan')
+
+    @property
+    def max_date(self) -> Optional[str]:
+        return self.queue[0][1] if self.queue else None
+
+    @property
+    def days_since_max(self) -> int:
+        """距今交易日数，最后一根K线即为最高时为1"""
+        return self.bar_count - self.queue[0][0] if self.queue else -1
+
+    @classmethod
+    def from_history(cls, window: int, dates: List[str], highs: np.ndarray) -> "RollingHighState":
+        """用历史数据的最后 window 根有效K线初始化状态"""
+        state = cls(window)
+        highs = np.asarray(highs, dtype=np.float64)
+        valid_rows = np.flatnonzero(~np.isnan(highs))[-window:]
+        for row in valid_rows:
+            state.update(dates[row], float(highs[row]))
+        return state
+
+    @classmethod
+    def from_history_block(cls, windows: Sequence[int], dates: List[str],
+                           high: np.ndarray) -> List[Dict[int, "RollingHighState"]]:
+        """一次初始化多只股票各窗口的状态，结果与逐只股票调用 from_history 相同
+
+        队列中保留的是不低于其后所有K线的K线，与窗口起点无关，因此整块数组一次求出全部候选K线，
+        每只股票只需按窗口截取，不必逐根K线更新。
+
+        Args:
+            windows: 窗口长度列表
+            dates: 日期列表
+            high: 日期 × 股票 的最高价数组，日期升序
+
+        Returns:
+            list: 每只股票一个 窗口长度 -> 状态 的字典
+        """
+        # 只取覆盖每只股票最近 max(windows) 根有效K线的末尾若干行，停牌较多时成倍向前扩展
+        longest = max(windows)
+        need = np.minimum(np.count_nonzero(~np.isnan(high), axis=0), longest)
+        n_tail = min(longest, len(high))
+        while n_tail < len(high) and (np.count_nonzero(~np.isnan(high[-n_tail:]), axis=0) < need).any():
+            n_tail = min(n_tail * 2, len(high))
+        dates = dates[len(dates) - n_tail:]
+        high = np.asarray(high[len(high) - n_tail:], dtype=np.float64)
+
+        n_rows, n_cols = high.shape
+        valid = ~np.isnan(high)
+        filled = np.where(valid, high, -np.inf)
+        # 每行之后（不含当行）的最高价
+        later_max = np.concatenate([
+            np.maximum.accumulate(filled[::-1], axis=0)[::-1][1:], np.full((1, n_cols), -np.inf)
+        ])
+        # 每行到最后一行（含）之间的有效K线数，超出最长窗口的K线不会进入队列
+        valid_from_end = np.cumsum(valid[::-1], axis=0)[::-1]
+        keep = valid & (filled >= later_max) & (valid_from_end <= longest)
+        total_valid = valid_from_end[0] if n_rows else np.zeros(n_cols, dtype=np.int64)
+        last_row = n_rows - 1 - valid[::-1].argmax(axis=0) if n_rows else np.zeros(n_cols, dtype=np.int64)
+
+        # 按股票、行号升序排列的候选K线
+        keep_cols, keep_rows = np.nonzero(keep.T)
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(keep_cols, minlength=n_cols))])
+        results = []
+        for col in range(n_cols):
+            rows = keep_rows[bounds[col]:bounds[col + 1]]
+            counts = valid_from_end[rows, col]
+            candidates = list(zip(counts.tolist(), [dates[row] for row in rows], high[rows, col].tolist()))
+            has_data = total_valid[col] > 0
+            states = {}
+            for window in windows:
+                bar_count = int(min(window, total_valid[col]))
+                # counts 递减，窗口内的候选K线为末尾一段
+                start = int(np.searchsorted(-counts, -window, side='left'))
+                queue = [[bar_count - count, date, price] for count, date, price in candidates[start:]]
+                states[window] = cls(
+                    window, bar_count,
+                    dates[last_row[col]] if has_data else None,
+                    float(high[last_row[col], col]) if has_data else None,
+                    queue,
+                )
+            results.append(states)
+        return results
+
+    def to_dict(self) -> Dict:
+        return {
+            "bar_count": self.bar_count,
+            "last_date": self.last_date,
+            "last_high": self.last_high,
+            "queue": list(self.queue),
+        }
+
+    @classmethod
+    def from_dict(cls, window: int, data: Dict) -> "RollingHighState":
+        return cls(window, data["bar_count"], data["last_date"], data["last_high"], data["queue"])
+
+
+class RollingHighBook:
+    """全部股票多个窗口的滚动最高价状态，收盘后只需用新增的K线更新，并在两次运行之间持久化"""
+    def __init__(self, windows: Union[int, Sequence[int]], path: Optional[Union[str, Path]] = None):
+        """
+        Args:
+            windows: 窗口长度或窗口长度列表
+            path: 状态文件路径，默认按窗口长度命名
+        """
+        self.windows = sorted({int(w) for w in ([windows] if isinstance(windows, (int, np.integer)) else windows)})
+        name = "_".join(str(w) for w in self.windows)
+        self.path = Path(path) if path else DataPathManager.BASE_PATH / f"rolling_high_{name}.json"
+        # 股票代码 -> 窗口长度 -> 状态
+        self.states: Dict[str, Dict[int, RollingHighState]] = {}
+        self.load()
+
+    @property
+    def window(self) -> int:
+        """最长的窗口"""
+        return self.windows[-1]
+
+    def load(self) -> None:
+        """读取保存的状态，窗口长度不一致时丢弃"""
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("windows") != self.windows:
+                return
+            self.states = {
+                code: {int(w): RollingHighState.from_dict(int(w), state) for w, state in states.items()}
+                for code, states in data["states"].items()
+            }
+        except Exception as e:
+            logger.warning(f"读取滚动最高价状态失败，将重新计算: {str(e)}")
+            self.states = {}
+
+    def save(self) -> None:
+        """保存状态（先写临时文件再替换）"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump({
+                "windows": self.windows,
+                "states": {
+                    code: {str(w): state.to_dict() for w, state in states.items()}
+                    for code, states in self.states.items()
+                },
+            }, f, ensure_ascii=False)
+        tmp_path.replace(self.path)
+
+    def update_from_panel(self, panel: "PricePanelStore", codes: List[str]) -> int:
+        """用价格面板中状态最后日期之后的K线更新各股票的状态
+
+        每只股票只读取一次面板数据，每根新K线依次更新所有窗口的状态。
+        没有状态或状态最后一根K线的价格与面板不一致时（除权除息后前复权价格变化），
+        从面板重新初始化该股票的状态，需要重新初始化的股票最后一起整块计算。
+
+        Returns:
+            int: 重新初始化的股票数量
+        """
+        dates = panel.dates
+        n_dates = len(dates)
+        reseed_codes = []
+        for code in codes:
+            highs = panel.get_symbol(code, 'high')
+            if highs is None:
+                continue
+            states = self.states.get(code)
+            start_row = None
+            if states is not None and set(states) == set(self.windows):
+                state = states[self.window]
+                if state.last_date is not None:
+                    row = panel.date_index(state.last_date)
+                    if row is not None and np.isclose(highs[row], state.last_high):
+                        start_row = row + 1
+
+            if start_row is None:
+                reseed_codes.append(code)
+                continue
+            for row in range(start_row, n_dates):
+                high = float(highs[row])
+                if not np.isnan(high):
+                    for state in states.values():
+                        state.update(dates[row], high)
+
+        if reseed_codes:
+            cols = [panel.symbol_index(code) for code in reseed_codes]
+            seeded = RollingHighState.from_history_block(self.windows, dates, panel.get_field('high')[:, cols])
+            self.states.update(zip(reseed_codes, seeded))
+        return len(reseed_codes)
+
+    def to_frame(self, codes: List[str], names: List[str], primary: Optional[int] = None) -> pd.DataFrame:
+        """输出与 get_history_max_price 相同列的结果
+
+        Args:
+            codes: 股票代码
+            names: 股票名称
+            primary: 输出为 历史最高、历史最高日期、距今交易日数 的窗口，默认为最长的窗口
+        """
+        primary = int(primary or self.window)
+        rows = []
+        for code, name in zip(codes, names):
+            states = self.states.get(code)
+            if not states or not states[primary].queue:
+                continue
+            row = {
+                '股票代码': code,
+                '股票名称': name,
+                '历史最高': states[primary].max_high,
+                '历史最高日期': states[primary].max_date,
+                '距今交易日数': states[primary].days_since_max,
+            }
+            for window, state in states.items():
+                high_col, date_col, days_col = window_columns(window)
+                row.update({high_col: state.max_high, date_col: state.max_date, days_col: state.days_since_max})
+            rows.append(row)
+        df = pd.DataFrame(rows)
+        if not df.empty:
+            for col in ['历史最高'] + [window_columns(w)[0] for w in self.windows]:
+                df[col] = df[col].astype('float32')
+        return df
@@ -0,0 +1,180 @@
+import ast
+import operator
+import re
+from typing import Callable, Dict, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from config.config_manager import ConfigTools
+
+# 默认筛选规则：创历史新高且流通市值大于100亿，同时排除价格或市值异常的数据
+DEFAULT_RULES = {
+    "新高": "历史最高 > 0 and 最高 > 0 and 流通市值 > 0 and 历史最高 <= 最高 and 流通市值 > 1e10",
+}
+
+_COMPARE_OPS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+# 反引号用于引用含特殊字符的列名，例如 `市盈率-动态` > 0
+_QUOTED_COLUMN = re.compile(r"`([^`]+)`")
+
+Evaluator = Callable[["_EvalContext"], np.ndarray]
+
+
+class _EvalContext:
+    """一次筛选的求值上下文，同一快照中的列和相同的子表达式只计算一次"""
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.columns: Dict[str, np.ndarray] = {}
+        self.results: Dict[str, np.ndarray] = {}
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self.columns:
+            if name not in self.df.columns:
+                raise KeyError(f"筛选规则引用的列不存在: {name}")
+            self.columns[name] = pd.to_numeric(self.df[name], errors='coerce').to_numpy(dtype=np.float64)
+        return self.columns[name]
+
+
+class ScreenRule:
+    """由表达式编译得到的筛选规则
+
+    表达式支持列名、数值常量、+ - * /、比较运算（可连写，如 0 < 涨跌幅 < 5）、and、or、not 和括号，
+    列名含特殊字符时用反引号引用。比较中任一侧为缺失值时结果为 False。
+    """
+    def __init__(self, name: str, expression: str):
+        self.name = name
+        self.expression = expression
+        self._aliases: Dict[str, str] = {}
+        source = _QUOTED_COLUMN.sub(self._alias, expression.strip())
+        try:
+            tree = ast.parse(source, mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f"筛选规则 {name} 语法错误: {expression}") from e
+        self.columns: Set[str] = set()
+        self._evaluate = self._compile(tree.body)
+
+    def _alias(self, match: re.Match) -> str:
+        # 别名由列名确定，不同规则中的相同列得到相同别名，子表达式缓存才能共享
+        alias = "_col_" + match.group(1).encode('utf-8').hex()
+        self._aliases[alias] = match.group(1)
+        return alias
+
+    def _compile(self, node: ast.AST) -> Evaluator:
+        """把语法树编译为求值函数，结果按子表达式缓存在上下文中"""
+        key = ast.dump(node)
+        evaluate = self._compile_node(node)
+
+        def cached(ctx: _EvalContext) -> np.ndarray:
+            if key not in ctx.results:
+                ctx.results[key] = evaluate(ctx)
+            return ctx.results[key]
+        return cached
+
+    def _compile_node(self, node: ast.AST) -> Evaluator:
+        if isinstance(node, ast.Name):
+            column = self._aliases.get(node.id, node.id)
+            self.columns.add(column)
+            return lambda ctx: ctx.column(column)
+
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            value = float(node.value)
+            return lambda ctx: np.float64(value)
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+            operand = self._compile(node.operand)
+            if isinstance(node.op, ast.Not):
+                return lambda ctx: ~operand(ctx).astype(bool)
+            return lambda ctx: -operand(ctx)
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            op = _BINARY_OPS[type(node.op)]
+            left, right = self._compile(node.left), self._compile(node.right)
+            return lambda ctx: op(left(ctx), right(ctx))
+
+        if isinstance(node, ast.BoolOp):
+            values = [self._compile(value) for value in node.values]
+            reduce = np.logical_and.reduce if isinstance(node.op, ast.And) else np.logical_or.reduce
+            return lambda ctx: reduce([np.broadcast_to(value(ctx), (len(ctx.df),)) for value in values])
+
+        if isinstance(node, ast.Compare) and all(type(op) in _COMPARE_OPS for op in node.ops):
+            operands = [self._compile(node.left)] + [self._compile(c) for c in node.comparators]
+            ops = [_COMPARE_OPS[type(op)] for op in node.ops]
+
+            def compare(ctx: _EvalContext) -> np.ndarray:
+                values = [operand(ctx) for operand in operands]
+                masks = [np.broadcast_to(op(values[i], values[i + 1]), (len(ctx.df),)) for i, op in enumerate(ops)]
+                return np.logical_and.reduce(masks)
+            return compare
+
+        raise ValueError(f"筛选规则 {self.name} 包含不支持的表达式: {ast.dump(node)}")
+
+    def evaluate(self, df: pd.DataFrame) -> np.ndarray:
+        """对单条规则求值，返回与 df 行对齐的布尔数组"""
+        return Screener({self.name: self}).evaluate(df)[self.name]
+
+    def __repr__(self) -> str:
+        return f"ScreenRule({self.name!r}, {self.expression!r})"
+
+
+class Screener:
+    """一组命名的筛选规则
+
+    所有规则在同一次遍历中求值：每个列只转换一次数值类型，相同的子表达式只计算一次，
+    每条规则得到一个布尔掩码，不复制快照数据。
+    """
+    def __init__(self, rules: Optional[Dict[str, object]] = None):
+        """
+        Args:
+            rules: 规则名到表达式（或 ScreenRule）的映射，默认为 DEFAULT_RULES；第一条为主规则
+        """
+        rules = rules or DEFAULT_RULES
+        self.rules: Dict[str, ScreenRule] = {
+            name: rule if isinstance(rule, ScreenRule) else ScreenRule(name, str(rule))
+            for name, rule in rules.items()
+        }
+
+    @classmethod
+    def from_config(cls, config: Optional[ConfigTools] = None, section: str = "Screen.Rules") -> "Screener":
+        """从配置文件读取规则，未配置时使用默认规则"""
+        config = config or ConfigTools()
+        return cls(config.get_section(section) or None)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.rules)
+
+    @property
+    def primary(self) -> str:
+        """主规则名称，用于监控提醒"""
+        return self.names[0]
+
+    @property
+    def columns(self) -> Set[str]:
+        """所有规则引用的列"""
+        return set().union(*(rule.columns for rule in self.rules.values()))
+
+    def evaluate(self, df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """对所有规则求值
+
+        Returns:
+            Dict[str, np.ndarray]: 规则名到与 df 行对齐的布尔掩码
+        """
+        ctx = _EvalContext(df)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return {
+                name: np.array(np.broadcast_to(rule._evaluate(ctx), (len(df),)), dtype=bool)
+                for name, rule in self.rules.items()
+            }
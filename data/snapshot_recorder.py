@@ -0,0 +1,208 @@
+import json
+import queue
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from data.tools import DataPathManager, logger
+
+# 索引文件每条记录：快照时间戳、数据文件中的偏移量和长度
+INDEX_DTYPE = np.dtype([('timestamp', '<f8'), ('offset', '<i8'), ('length', '<i8')])
+_HEADER = struct.Struct('<I')
+
+
+def _default_root() -> Path:
+    return DataPathManager.BASE_PATH / "snapshots"
+
+
+def encode_snapshot(df: pd.DataFrame) -> bytes:
+    """把一个快照编码为压缩的列式二进制记录
+
+    数值列按 float64 连续存放，其余列按字符串存放，整体用 zlib 压缩。
+    """
+    numeric_columns = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+    string_columns = [col for col in df.columns if col not in numeric_columns]
+    header = json.dumps({
+        "n_rows": len(df),
+        "columns": [str(col) for col in df.columns],
+        "numeric_columns": numeric_columns,
+        "numeric_dtypes": [str(df[col].dtype) for col in numeric_columns],
+        "string_columns": string_columns,
+    }, ensure_ascii=False).encode('utf-8')
+
+    parts = [_HEADER.pack(len(header)), header]
+    for col in string_columns:
+        encoded = "\x00".join(df[col].astype(str).tolist()).encode('utf-8')
+        parts += [_HEADER.pack(len(encoded)), encoded]
+    if numeric_columns:
+        parts.append(np.ascontiguousarray(df[numeric_columns].to_numpy(dtype='<f8').T).tobytes())
+    return zlib.compress(b"".join(parts), 6)
+
+
+def decode_snapshot(data: Union[bytes, memoryview]) -> pd.DataFrame:
+    """解码 encode_snapshot 生成的记录"""
+    payload = zlib.decompress(data)
+    (header_len,) = _HEADER.unpack_from(payload, 0)
+    pos = _HEADER.size
+    header = json.loads(payload[pos:pos + header_len].decode('utf-8'))
+    pos += header_len
+
+    n_rows = header["n_rows"]
+    columns = {}
+    for col in header["string_columns"]:
+        (length,) = _HEADER.unpack_from(payload, pos)
+        pos += _HEADER.size
+        values = payload[pos:pos + length].decode('utf-8').split("\x00") if n_rows else []
+        columns[col] = values
+        pos += length
+    numeric_columns = header["numeric_columns"]
+    if numeric_columns:
+        matrix = np.frombuffer(payload, dtype='<f8', count=len(numeric_columns) * n_rows, offset=pos)
+        dtypes = header.get("numeric_dtypes", ['float64'] * len(numeric_columns))
+        for col, dtype, values in zip(numeric_columns, dtypes, matrix.reshape(len(numeric_columns), n_rows)):
+            columns[col] = values.astype(dtype, copy=False)
+    return pd.DataFrame(columns, columns=header.get("columns", list(columns)))
+
+
+class SnapshotLog:
+    """单个交易日的快照日志，包含只追加的数据文件和定长索引文件"""
+    def __init__(self, trade_date: str, root: Optional[Union[str, Path]] = None):
+        self.trade_date = trade_date
+        self.path = Path(root) if root else _default_root()
+        self.data_file = self.path / f"snapshots_{trade_date}.bin"
+        self.index_file = self.path / f"snapshots_{trade_date}.idx"
+
+    def append(self, df: pd.DataFrame, timestamp: float) -> None:
+        """追加一个快照，先写数据再写索引，中途崩溃时未写入索引的数据会被忽略"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        record = encode_snapshot(df)
+        with open(self.data_file, "ab") as f:
+            offset = f.tell()
+            f.write(record)
+        entry = np.array([(timestamp, offset, len(record))], dtype=INDEX_DTYPE)
+        with open(self.index_file, "ab") as f:
+            f.write(entry.tobytes())
+
+    def index(self) -> np.ndarray:
+        """以内存映射方式读取索引，忽略末尾不完整的记录"""
+        if not self.index_file.exists():
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        n_entries = self.index_file.stat().st_size // INDEX_DTYPE.itemsize
+        if n_entries == 0:
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        return np.memmap(self.index_file, dtype=INDEX_DTYPE, mode='r', shape=(n_entries,))
+
+    def timestamps(self) -> np.ndarray:
+        return np.asarray(self.index()['timestamp'])
+
+    def read(self, start: Optional[float] = None, end: Optional[float] = None,
+             codes: Optional[Sequence[str]] = None, code_column: str = '代码') -> Iterator[Tuple[float, pd.DataFrame]]:
+        """按时间范围（含两端）和股票代码读取快照
+
+        Args:
+            start: 起始时间戳，None表示从第一个快照开始
+            end: 结束时间戳，None表示到最后一个快照
+            codes: 只返回这些股票，None表示全部
+            code_column: 股票代码列名
+
+        Yields:
+            tuple: (时间戳, 快照DataFrame)
+        """
+        index = self.index()
+        if len(index) == 0:
+            return
+        timestamps = np.asarray(index['timestamp'])
+        first = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        last = len(index) if end is None else int(np.searchsorted(timestamps, end, side='right'))
+        if first >= last:
+            return
+
+        data = np.memmap(self.data_file, dtype=np.uint8, mode='r')
+        code_set = set(str(code) for code in codes) if codes is not None else None
+        for entry in index[first:last]:
+            offset, length = int(entry['offset']), int(entry['length'])
+            df = decode_snapshot(memoryview(data[offset:offset + length]))
+            if code_set is not None:
+                df = df[df[code_column].isin(code_set)].reset_index(drop=True)
+            yield float(entry['timestamp']), df
+
+    def read_frame(self, start: Optional[float] = None, end: Optional[float] = None,
+                   codes: Optional[Sequence[str]] = None, code_column: str = '代码') -> pd.DataFrame:
+        """读取快照并合并为一个DataFrame，增加 '时间戳' 列"""
+        frames = [df.assign(时间戳=timestamp) for timestamp, df in self.read(start, end, codes, code_column)]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+class SnapshotRecorder:
+    """后台记录实时快照
+
+    record 只把快照放入队列，编码和写盘在后台线程中完成，不阻塞监控循环；
+    队列满时丢弃快照并记录警告。
+    """
+    def __init__(self, root: Optional[Union[str, Path]] = None, max_queue: int = 64):
+        self.root = Path(root) if root else _default_root()
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._logs = {}
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="SnapshotRecorder", daemon=True)
+            self._thread.start()
+
+    def record(self, df: pd.DataFrame, timestamp: float, trade_date: str) -> None:
+        """提交一个快照
+
+        Args:
+            df: 实时快照
+            timestamp: 快照时间，回放时为模拟时钟的时间
+            trade_date: 快照所属的交易日（YYYYMMDD），决定写入哪个快照日志，由调用方按交易日历确定
+        """
+        if not trade_date:
+            raise ValueError("未指定快照所属的交易日")
+        self.start()
+        try:
+            self._queue.put_nowait((df, timestamp, trade_date))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"快照记录队列已满，丢弃快照 (累计 {self.dropped})")
+
+    def _get_log(self, trade_date: str) -> SnapshotLog:
+        if trade_date not in self._logs:
+            self._logs = {trade_date: SnapshotLog(trade_date, self.root)}
+        return self._logs[trade_date]
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                df, timestamp, trade_date = item
+                self._get_log(trade_date).append(df, timestamp)
+            except Exception as e:
+                logger.error(f"记录快照失败: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """等待已提交的快照全部写入"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def stop(self) -> None:
+        """写完队列中的快照后停止后台线程"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+
+    def reader(self, trade_date: str) -> SnapshotLog:
+        """获取指定交易日的快照日志用于读取"""
+        return SnapshotLog(trade_date, self.root)
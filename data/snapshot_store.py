@@ -0,0 +1,126 @@
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+class SnapshotRingBuffer:
+    """实时行情快照的列式环形缓冲区
+
+    保存最近 capacity 个快照，每个字段为 快照 × 股票 的数值数组，股票按代码索引对齐。
+    每次写入新快照后可得到价格、最高价或市值与上一个快照相比发生变化的股票，
+    下游筛选只需处理这些行。
+    """
+    DEFAULT_FIELDS = ('最新价', '最高', '流通市值')
+
+    def __init__(self, capacity: int = 10, fields: Sequence[str] = DEFAULT_FIELDS, code_column: str = '代码'):
+        """
+        Args:
+            capacity: 保留的快照数量
+            fields: 保存并用于判断变化的数值列
+            code_column: 股票代码列名
+        """
+        if capacity < 2:
+            raise ValueError("快照缓冲区至少需要保存2个快照")
+        self.capacity = capacity
+        self.fields = list(fields)
+        self.code_column = code_column
+        self._lock = threading.Lock()
+        self._codes: List[str] = []
+        self._code_index = pd.Index([], dtype=object)
+        self._data: Dict[str, np.ndarray] = {field: np.empty((capacity, 0)) for field in self.fields}
+        self._timestamps = np.full(capacity, np.nan)
+        self._count = 0
+        self._changed = np.zeros(0, dtype=bool)
+
+    @property
+    def symbols(self) -> List[str]:
+        return self._codes
+
+    @property
+    def snapshot_count(self) -> int:
+        """当前缓冲区中的快照数量"""
+        return min(self._count, self.capacity)
+
+    def _slot(self, age: int = 0) -> int:
+        """age 个快照之前的快照所在的行，0为最新快照"""
+        if age >= self.snapshot_count:
+            raise IndexError(f"缓冲区中没有 {age} 个快照之前的数据")
+        return (self._count - 1 - age) % self.capacity
+
+    def _align(self, codes: pd.Index) -> np.ndarray:
+        """返回快照各行对应的股票列号，新出现的股票追加到末尾"""
+        positions = self._code_index.get_indexer(codes)
+        new_codes = codes[positions < 0]
+        if len(new_codes):
+            self._codes.extend(new_codes.tolist())
+            self._code_index = pd.Index(self._codes, dtype=object)
+            for field in self.fields:
+                grown = np.full((self.capacity, len(self._codes)), np.nan)
+                grown[:, :self._data[field].shape[1]] = self._data[field]
+                self._data[field] = grown
+            positions = self._code_index.get_indexer(codes)
+        return positions
+
+    def push(self, df: pd.DataFrame, timestamp: Optional[float] = None) -> np.ndarray:
+        """写入一个新快照
+
+        Args:
+            df: 实时行情数据
+            timestamp: 快照时间戳，默认为当前时间
+
+        Returns:
+            np.ndarray: 与 df 行对齐的布尔数组，True 表示该股票相对上一个快照有变化（新股票视为变化）
+        """
+        codes = pd.Index(df[self.code_column].astype(str), dtype=object)
+        with self._lock:
+            positions = self._align(codes)
+            slot = self._count % self.capacity
+            for field in self.fields:
+                row = np.full(len(self._codes), np.nan)
+                if field in df.columns:
+                    row[positions] = pd.to_numeric(df[field], errors='coerce').to_numpy(dtype=np.float64)
+                self._data[field][slot] = row
+            self._timestamps[slot] = timestamp if timestamp is not None else time.time()
+            self._count += 1
+            self._changed = self._diff()
+            return self._changed[positions]
+
+    def _diff(self) -> np.ndarray:
+        """最新快照与上一个快照相比有变化的股票（按股票列号）"""
+        n_symbols = len(self._codes)
+        if self.snapshot_count < 2:
+            return np.ones(n_symbols, dtype=bool)
+        current, previous = self._slot(0), self._slot(1)
+        changed = np.zeros(n_symbols, dtype=bool)
+        for field in self.fields:
+            new, old = self._data[field][current], self._data[field][previous]
+            changed |= (new != old) & ~(np.isnan(new) & np.isnan(old))
+        return changed
+
+    def changed_codes(self) -> List[str]:
+        """最新快照中发生变化的股票代码"""
+        return [code for code, changed in zip(self._codes, self._changed) if changed]
+
+    def get(self, field: str, age: int = 0) -> np.ndarray:
+        """获取某个快照的字段数组（按 symbols 顺序）"""
+        return self._data[field][self._slot(age)]
+
+    def get_timestamp(self, age: int = 0) -> float:
+        return float(self._timestamps[self._slot(age)])
+
+    def history(self, field: str) -> np.ndarray:
+        """按时间先后返回缓冲区中全部快照的字段数组，形状为 快照 × 股票"""
+        slots = [self._slot(age) for age in range(self.snapshot_count - 1, -1, -1)]
+        return self._data[field][slots]
+
+    def clear(self) -> None:
+        """清空快照（例如交易日切换时）"""
+        with self._lock:
+            self._count = 0
+            self._timestamps[:] = np.nan
+            for field in self.fields:
+                self._data[field][:] = np.nan
+            self._changed = np.ones(len(self._codes), dtype=bool)
@@ -1,36 +1,51 @@
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 
-import akshare as ak
 from config.config_manager import ConfigTools
 from config.constants import MARKET_CODES, MARKET_HOURS
-from data.tools import file_exist_or_get_data, file_exist_or_get_data_decorator, logger
-
+from data.tools import BatchCheckpoint, DataPathManager, file_exist_or_get_data_decorator, get_cached_file, logger
+from data.panel_store import PricePanelStore
+from data.fetch_engine import FetchEngine
+from data.rolling_high import RollingHighBook, forward_max, forward_min, rolling_max, select_with_cooldown, trailing_highs, window_columns
+from data.symbol_master import get_symbol_master
+from data.snapshot_store import SnapshotRingBuffer
+from data.snapshot_recorder import SnapshotRecorder
+from data.clock import SystemClock, default_clock
+from data.providers import MarketDataProvider, get_provider
+from data.history_index import HistoryIndex
+from data.trade_calendar import get_trading_calendar
+from data.screening import Screener, ScreenRule
+
+import numpy as np
 import pandas as pd
-from pandas_market_calendars import get_calendar
-import requests
 
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 class MarketTimeTools:
     """市场时间工具类"""
-    def __init__(self, market: str = "A"):
+    def __init__(self, market: str = "A", clock: Optional[SystemClock] = None):
         self.market = MARKET_CODES[market]
+        self.clock = clock or default_clock
     
     def is_market_time(self, now: Optional[datetime] = None) -> int:
         """判断是否为交易时间
         返回0为未开盘
         返回1为交易中
-        返回-1为已收盘
+        返回-1为已收盘（非交易日也返回-1）
+        返回2为午间休市
         """
         if self.market not in MARKET_HOURS.keys():
             raise ValueError(f"不支持的市场类型: {self.market}")
         else:
             time_range = MARKET_HOURS[self.market]
 
+        now = now or self.clock.now()
+        # 节假日和周末按交易日历判断，日历每年只构建一次
+        if not get_trading_calendar(self.market, now.year).is_session(now):
+            return -1
 
-        now_time = datetime.now().time()
+        now_time = now.time()
         
         for (period_start, period_end) in time_range:
             if period_start <= now_time <= period_end:
@@ -41,45 +56,34 @@ class MarketTimeTools:
         elif now_time > time_range[-1][1]: 
             return -1
         else:
-            return 
+            return 2
 
 
 
 class TradeDateTools:
     """数据工具类"""
-    def __init__(self, market: str = "A"):
+    def __init__(self, market: str = "A", provider: Optional[MarketDataProvider] = None,
+                 clock: Optional[SystemClock] = None):
         if market not in MARKET_CODES:
             raise ValueError(f"不支持的市场类型: {market}")
 
         self.market = MARKET_CODES[market]
+        self.provider = provider or get_provider()
+        self.clock = clock or default_clock
         self.config = ConfigTools()
         self.last_trade_date = self.get_last_trade_date()
    
-    def get_last_trade_date(self, range_days: int = 10) -> str:
-        """获取最近的交易日期"""
+    def get_last_trade_date(self) -> str:
+        """获取最近的交易日期（当日收盘前为前一个交易日），当前时间取自时钟"""
         try:
-            calendar = get_calendar(self.market)
-            end_date = datetime.now().strftime('%Y%m%d')
-            start_date = (datetime.now() - pd.Timedelta(days=range_days)).strftime('%Y%m%d')
-            schedule = calendar.schedule(start_date=start_date, end_date=end_date)
-            
-            if schedule.empty:
-                raise ValueError("未能获取交易日历")
-            
-            # 获取最后一个交易日的收盘时间
-            latest_date = schedule.index[-1]
-            latest_close = schedule.loc[latest_date, 'market_close']
-            now = datetime.now(latest_close.tz)
-            
-            # 如果当前时间早于最后一个交易日的收盘时间，则取前一个交易日
-            if now < latest_close and len(schedule) > 1:
-                trade_date = schedule.iloc[-2]['market_close']
-            else:
-                trade_date = latest_close
-                
-            formatted_date = trade_date.strftime('%Y%m%d')
-            self.config.set_config("Running.Settings", f"LastTradeDate_{self.market}", formatted_date)
-            
+            now = self.clock.now()
+            formatted_date = get_trading_calendar(self.market, now.year, self.provider).last_trade_date(now)
+
+            # 只在交易日变化时写配置文件
+            config_key = f"LastTradeDate_{self.market}"
+            if self.config.get_config("Running.Settings", config_key) != formatted_date:
+                self.config.set_config("Running.Settings", config_key, formatted_date)
+
             return formatted_date
             
         except Exception as e:
@@ -96,24 +100,42 @@ class DFConvert:
     def safe_convert_numeric(df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
         """安全地转换数值类型"""
         for col in columns:
-            if col in df.columns:
+            # 列式缓存读取的数据已是数值类型，无需重复转换
+            if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
                 df[col] = pd.to_numeric(df[col], errors='coerce')
         return df
 
 
 class StockAHistoryData():
     """A股历史数据处理类"""
-    def __init__(self, market: str = "A",hist_data_year: int = 2, n_days_new_high: int = 250):
+    def __init__(self, market: str = "A",hist_data_year: int = 2, n_days_new_high: int = 250, incremental: bool = True,
+                 provider: Optional[MarketDataProvider] = None, new_high_windows: Optional[List[int]] = None,
+                 clock: Optional[SystemClock] = None):
         """
         Args:
             year (int): 获取历史数据的年数
+            incremental (bool): 是否基于上一交易日的缓存增量更新历史数据
+            provider (MarketDataProvider): 行情数据提供者，默认按配置创建
+            new_high_windows (List[int]): 同时计算的新高窗口，默认读取配置 [NewHigh.Settings] windows，
+                n_days_new_high 总是包含在内并作为主窗口
+            clock (SystemClock): 时钟，决定最后交易日和历史数据的起始日期，回放时传入模拟时钟
         """
-        self.data_tools = TradeDateTools(market)
+        self.provider = provider or get_provider()
+        self.clock = clock or default_clock
+        self.data_tools = TradeDateTools(market, self.provider, clock=self.clock)
         self.last_trade_date = self.data_tools.last_trade_date
         self.hist_data_year = hist_data_year    
         self.hist_data_days = self.hist_data_year*365  
         self.n_days_new_high = n_days_new_high
+        self.incremental = incremental
+        if new_high_windows is None:
+            configured = self.data_tools.config.get_config("NewHigh.Settings", "windows", "")
+            new_high_windows = [int(w) for w in configured.split(",") if w.strip()]
+        self.new_high_windows = sorted({int(w) for w in new_high_windows} | {n_days_new_high})
         self.stock_list = self.get_stock_list()
+        self.symbol_master = get_symbol_master(self.stock_list, self.last_trade_date)
+        self.price_panel = PricePanelStore()
+        self.fetch_engine = FetchEngine.from_config(self.data_tools.config, provider=self.provider)
 
     @file_exist_or_get_data_decorator(True, "A")
     def get_stock_daily_history(self, code: str) -> pd.DataFrame:
@@ -130,28 +152,74 @@ class StockAHistoryData():
             Exception: 其他获取数据过程中的异常
         """
         try:
-            start_date = (datetime.now() - pd.Timedelta(days=self.hist_data_days)).strftime('%Y%m%d')
-            ak.session = requests.Session()
-            ak.session.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"})
-            df = ak.stock_zh_a_hist(
-                symbol=code,
-                period="daily",
-                start_date=start_date,
-                end_date=self.last_trade_date,
-                adjust="qfq"
-            )
-            # print(df)
+            start_date = (self.clock.now() - pd.Timedelta(days=self.hist_data_days)).strftime('%Y%m%d')
+
+            # 增量模式：只获取上次缓存之后的数据并追加
+            previous_df = self._load_previous_history(code) if self.incremental else None
+            if previous_df is not None:
+                last_date = str(previous_df['日期'].iloc[-1]).replace('-', '')
+                new_df = self._fetch_daily_history(code, last_date)
+                merged_df = self._merge_incremental_history(previous_df, new_df, start_date)
+                if merged_df is not None:
+                    return merged_df
+                logger.info(f"股票{code}复权价格已变化，重新获取全部历史数据")
+
+            df = self._fetch_daily_history(code, start_date)
             if df.empty:
                 raise ValueError(f"未获取到股票{code}的数据")
             return df
         except Exception as e:
             logger.error(f"获取股票{code}历史数据失败: {str(e)}")
             raise
+
+    def _fetch_daily_history(self, code: str, start_date: str) -> pd.DataFrame:
+        """从接口获取指定起始日期至最后交易日的前复权日线数据"""
+        return self.provider.get_daily_history(code, start_date, self.last_trade_date, adjust="qfq")
+
+    def _load_previous_history(self, code: str) -> Optional[pd.DataFrame]:
+        """读取该股票之前交易日缓存的历史数据，不存在时返回None"""
+        previous_file = get_cached_file("get_stock_daily_history", (code,))
+        if previous_file is None:
+            return None
+        try:
+            df = DataPathManager.read_cache(previous_file)
+        except Exception as e:
+            logger.warning(f"读取股票{code}缓存历史数据失败: {str(e)}")
+            return None
+        if df.empty or '日期' not in df.columns:
+            return None
+        return df
+
+    @staticmethod
+    def _merge_incremental_history(previous_df: pd.DataFrame, new_df: pd.DataFrame, start_date: str) -> Optional[pd.DataFrame]:
+        """合并缓存数据与新增数据，并裁剪到配置的历史窗口
+
+        新数据从缓存的最后一个交易日开始获取，用这一天的收盘价校验前复权价格是否一致；
+        若发生除权除息导致复权价格变化，返回None，由调用方重新获取全部数据。
+        """
+        if new_df.empty:
+            merged_df = previous_df
+        else:
+            last_row = previous_df.iloc[-1]
+            first_row = new_df.iloc[0]
+            if str(first_row['日期']) != str(last_row['日期']):
+                return None
+            if abs(float(first_row['收盘']) - float(last_row['收盘'])) > 1e-6:
+                return None
+            # 新增数据的列类型与缓存保持一致，避免写入列式缓存时类型冲突
+            new_rows = new_df.iloc[1:].astype({
+                col: previous_df[col].dtype for col in new_df.columns if col in previous_df.columns
+            })
+            merged_df = pd.concat([previous_df, new_rows], ignore_index=True)
+
+        in_window = pd.to_datetime(merged_df['日期'].astype(str)) >= pd.to_datetime(start_date)
+        merged_df = merged_df[in_window.values].reset_index(drop=True)
+        return merged_df if not merged_df.empty else None
     
     @file_exist_or_get_data_decorator(True, "A")
     def get_stock_list(self) -> pd.DataFrame:
         """获取股票列表"""
-        return ak.stock_info_a_code_name()
+        return self.provider.get_stock_list()
     
     def stock_code_name_trans(self, code: str) -> str:
         """股票代码转换为股票名称
@@ -162,126 +230,122 @@ class StockAHistoryData():
         Returns:
             tuple: 包含股票代码和股票名称的元组
         """
-        if code in self.stock_list['code'].values:
-            return code, self.stock_list[self.stock_list['code'] == code]['name'].values[0]
-        elif code in self.stock_list['name'].values:
-            return self.stock_list[self.stock_list['name'] == code]['code'].values[0],code
-        else:
-            return None
-
-    def process_single_stock(self, code: str ) -> Optional[Dict]:
-
-        #TODO: 需要优化250日，365天的关系
-        try:
-            code, name = self.stock_code_name_trans(code)
-            
-            hist_data = self.get_stock_daily_history(code)
-            if hist_data is None or hist_data.empty:
-                logger.warning(f"股票 {code} {name} 未获取到历史数据")
-                return None
-
-            # 确保列名存在包括日期、开盘价、收盘价、最高价、最低价、成交量、成交额、振幅、涨跌幅、涨跌额、换手率等信息
-            required_columns = ['日期', '开盘', '收盘', '最高', '最低', '成交额', '振幅', '涨跌幅', '涨跌额', '换手率']
-            if not all(col in hist_data.columns for col in required_columns):
-                logger.warning(f"股票 {code} {name} 数据格式不正确")
-                return None
+        return self.symbol_master.resolve(code)
 
-            next_n_days = min(self.n_days_new_high, len(hist_data))
-            hist_data = hist_data[-next_n_days:].reset_index(drop=True)
+    def update_panel_history(self, code: str) -> bool:
+        """获取单个股票的历史数据（增量缓存）并写入价格面板"""
+        panel_columns = ['日期'] + list(PricePanelStore.FIELDS.values())
+        hist_data = self.get_stock_daily_history(code, cache_columns=panel_columns)
+        self.price_panel.write_history(code, hist_data)
+        return True
 
-            # 使用向量化操作进行数值转换和缺失值处理
-            hist_data['最高'] = pd.to_numeric(hist_data['最高'], errors='coerce')
-            hist_data.dropna(subset=['最高'], inplace=True)
-
-            if hist_data.empty:
-                return None
+    def _max_price_from_panel(self, stock_list: pd.DataFrame) -> pd.DataFrame:
+        """对价格面板中的全部股票一次性计算 new_high_windows 中各窗口的最高价
 
-            # 使用向量化操作查找最大值索引
-            max_price_idx = hist_data['最高'].idxmax()
-            max_date = hist_data.at[max_price_idx, '日期']
-            days_since_max = len(hist_data) - max_price_idx
-
-            return {
-                '股票代码': code,
-                '股票名称': name,
-                '历史最高': float(hist_data.at[max_price_idx, '最高']),
-                '历史最高日期': str(max_date),
-                '距今交易日数': int(days_since_max)
-            }
-        except Exception as e:
-            logger.error(f"处理股票{code}数据时出错: {str(e)}")
-            return None
+        Returns:
+            pd.DataFrame: 股票代码、股票名称，主窗口 n_days_new_high 的历史最高、历史最高日期、
+            距今交易日数，以及每个窗口的 N日最高、N日最高日期、N日距今交易日数
+        """
+        codes = [str(code) for code in stock_list['code']]
+        names = stock_list['name'].tolist()
+
+        if self.incremental:
+            # 增量模式：用保存的单调队列状态只处理新增的K线
+            book = RollingHighBook(self.new_high_windows)
+            reseeded = book.update_from_panel(self.price_panel, codes)
+            book.save()
+            logger.info(f"滚动最高价状态已更新，重新计算 {reseeded} 只股票")
+            return book.to_frame(codes, names, primary=self.n_days_new_high)
+
+        cols = [self.price_panel.symbol_index(code) for code in codes]
+        present = [i for i, col in enumerate(cols) if col is not None]
+        if not present:
+            return pd.DataFrame()
+
+        high = self.price_panel.get_field('high')[:, [cols[i] for i in present]]
+        results = trailing_highs(high, self.new_high_windows)
+        dates = np.asarray(self.price_panel.dates)
+
+        max_price, max_row, days_since_max = results[self.n_days_new_high]
+        df = pd.DataFrame({
+            '股票代码': [codes[i] for i in present],
+            '股票名称': [names[i] for i in present],
+            '历史最高': max_price.astype('float32'),
+            '历史最高日期': dates[np.maximum(max_row, 0)],
+            '距今交易日数': days_since_max.astype(int),
+        })
+        for window, (max_price, max_row, days_since_max) in results.items():
+            high_col, date_col, days_col = window_columns(window)
+            df[high_col] = max_price.astype('float32')
+            df[date_col] = dates[np.maximum(max_row, 0)]
+            df[days_col] = days_since_max.astype(int)
+        return df[results[self.n_days_new_high][1] >= 0].reset_index(drop=True)
 
     @file_exist_or_get_data_decorator(True, "A")
     def get_history_max_price(self) -> pd.DataFrame:
-        """获取所有股票的历史最高价格数据"""
+        """获取所有股票的历史最高价格数据，new_high_windows 中的各窗口在同一次计算中得到"""
         try:
-            stock_list = file_exist_or_get_data(ak.stock_info_a_code_name, [1, "A"])
+            stock_list = self.get_stock_list()
             if stock_list.empty:
                 raise ValueError("获取股票列表失败")
 
-            results = []
             total_stocks = len(stock_list)
-            processed_count = 0
-            error_count = 0
-            
-            # 计算最佳线程数
-            max_workers = min(20, (total_stocks + 49) // 50)  # 每50个股票分配一个线程，最多20个线程
-            
-            # 使用线程池处理数据
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # 分批提交任务，避免内存占用过大
-                batch_size = 100
-                for i in range(0, total_stocks, batch_size):
+            batch_size = 100
+
+            # 同一交易日内中断后重新运行时，从最后完成的批次继续
+            checkpoint = BatchCheckpoint("get_history_max_price", self.last_trade_date, batch_size)
+            completed_batches, updated_codes, error_count = checkpoint.load()
+            processed_count = min(completed_batches * batch_size, total_stocks)
+            if completed_batches:
+                logger.info(f"从检查点恢复: 已完成 {processed_count}/{total_stocks}")
+
+            # 第一步：分批更新价格面板中还没有最新交易日数据的股票，
+            # 由获取引擎负责限速、重试和并发控制；面板按股票总数预先分配容量
+            self.price_panel.reserve_symbols(total_stocks)
+            # 整个扫描期间引擎保持打开，所有批次共用连接池、线程池和事件循环
+            with self.fetch_engine:
+                for batch_index, i in enumerate(range(0, total_stocks, batch_size)):
+                    if batch_index < completed_batches:
+                        continue
                     batch_stocks = stock_list.iloc[i:i+batch_size]
-                    
-                    # 创建批次任务
-                    future_to_stock = {
-                        executor.submit(
-                            self.process_single_stock, 
-                            str(row['code'])
-                        ): row 
-                        for _, row in batch_stocks.iterrows()
-                    }
-
-                    # 处理完成的任务
-                    for future in as_completed(future_to_stock):
-                        processed_count += 1
-                        stock = future_to_stock[future]
-                        
-                        try:
-                            result = future.result()
-                            if result:
-                                results.append(result)
-                            
-                            # 每处理100个股票显示一次进度
-                            if processed_count % 100 == 0:
-                                success_rate = (processed_count - error_count) / processed_count * 100
-                                logger.info(
-                                    f"处理进度: {processed_count}/{total_stocks} "
-                                    f"({processed_count/total_stocks*100:.1f}%) - "
-                                    f"成功率: {success_rate:.1f}%"
-                                )
-                                
-                        except Exception as e:
-                            error_count += 1
-                            logger.error(f"处理股票 {stock['code']} {stock['name']} 失败: {str(e)}")
+                    codes = [
+                        str(code) for code in batch_stocks['code']
+                        if not self.price_panel.is_symbol_current(str(code), self.last_trade_date)
+                    ]
+
+                    if codes:
+                        batch_results, failures = self.fetch_engine.run(codes, self.update_panel_history)
+                        updated_codes.extend(batch_results.keys())
+                        error_count += len(failures)
+                        for code, e in failures.items():
+                            logger.error(f"更新股票 {code} 历史数据失败: {str(e)}")
+                    processed_count += len(batch_stocks)
+
+                    # 每批完成后保存价格面板和检查点
+                    self.price_panel.flush()
+                    checkpoint.save(batch_index + 1, updated_codes, error_count)
+
+                    success_rate = (processed_count - error_count) / processed_count * 100
+                    logger.info(
+                        f"处理进度: {processed_count}/{total_stocks} "
+                        f"({processed_count/total_stocks*100:.1f}%) - "
+                        f"成功率: {success_rate:.1f}% - {self.fetch_engine.get_stats()}"
+                    )
+
+            # 第二步：在价格面板上一次计算全部股票的窗口最高价
+            df = self._max_price_from_panel(stock_list)
 
             # 最终处理结果统计
-            if not results:
+            if df.empty:
                 raise ValueError("未能获取任何有效数据")
-            
+
             success_rate = (processed_count - error_count) / processed_count * 100
             logger.info(
-                f"处理完成 - 总数: {total_stocks}, 成功: {len(results)}, "
+                f"处理完成 - 总数: {total_stocks}, 成功: {len(df)}, 本次更新: {len(updated_codes)}, "
                 f"失败: {error_count}, 成功率: {success_rate:.1f}%"
             )
 
-            # 转换为DataFrame并优化内存使用
-            df = pd.DataFrame(results)
-            for col in df.select_dtypes(include=['float64']).columns:
-                df[col] = df[col].astype('float32')
-            
+            checkpoint.clear()
             return df
             
         except Exception as e:
@@ -297,37 +361,48 @@ class StockNewHighAnalysis():
         self.next_n_days = next_n_days
         self.n_days_next_new_high = n_days_next_new_high
 
+    @classmethod
+    def from_panel(cls, panel: PricePanelStore, code: str, **kwargs) -> "StockNewHighAnalysis":
+        """从价格面板读取单个股票的历史数据创建分析对象"""
+        df = panel.get_symbol_frame(code)
+        if df.empty:
+            raise ValueError(f"价格面板中没有股票{code}的数据")
+        return cls(df, **kwargs)
+
     def new_high_next_n_days_df(self):
         """
+        找出创 n_days_new_high 日新高的交易日（当日最高价等于含当日在内 n_days_new_high+1 根K线的最高价），
+        每次新高后 n_days_next_new_high 个交易日内的新高忽略，并计算之后 next_n_days 天
+        （含新高当日）相对新高当日最高价的收盘涨跌幅、最大涨幅和最大跌幅。
+
         返回:
             pd.DataFrame: 包含新高分析结果的DataFrame
         """
-        new_high_list = []
-        new_high_flag = 0
-        next_n_days_high = 0
-        for i in range(len(self.df)-self.n_days_new_high):
-            # TODO: 检验验证是否正确    
-            if float(self.df.loc[i+self.n_days_new_high, '最高']) == float(self.df.loc[i:i+self.n_days_new_high, '最高'].max()) and new_high_flag == 0:                
-                n_days_close,n_days_high,n_days_low = self.n_days_high_low_analysis(self.df.loc[i+self.n_days_new_high, '日期'], self.next_n_days)
-                if n_days_high !=""and n_days_low !="":
-                    self.df.loc[i+self.n_days_new_high, 'n日后涨跌幅'] = n_days_close
-                    self.df.loc[i+self.n_days_new_high, 'n日最大涨幅'] = n_days_high
-                    self.df.loc[i+self.n_days_new_high, 'n日最大跌幅'] = n_days_low
-                    new_high_list.append(self.df.loc[i+self.n_days_new_high])
-                    new_high_flag = 1
-            if new_high_flag == 1:
-                if next_n_days_high < self.n_days_next_new_high:
-                   next_n_days_high += 1
-                else:
-                    new_high_flag = 0
-                    next_n_days_high = 0
-        #TODO 继续验证
-        if len(new_high_list) == 0:
-            #返回空的df[['日期','开盘','收盘','最高','最低','n日最大涨幅','n日最大跌幅']]
+        n_rows = len(self.df)
+        if n_rows - self.n_days_new_high <= 0:
             return pd.DataFrame(columns=['日期','开盘','收盘','最高','最低','n日最大涨幅','n日最大跌幅'])
-        df = pd.DataFrame(new_high_list)
-        
-        return df[['日期','开盘','收盘','最高','最低','n日后涨跌幅','n日最大涨幅','n日最大跌幅']]
+
+        high = pd.to_numeric(self.df['最高'], errors='coerce').to_numpy(dtype=np.float64)
+        low = pd.to_numeric(self.df['最低'], errors='coerce').to_numpy(dtype=np.float64)
+        close = pd.to_numeric(self.df['收盘'], errors='coerce').to_numpy(dtype=np.float64)
+
+        # 新高判断，最后一天之后没有数据，不计入
+        candidates = high == rolling_max(high, self.n_days_new_high + 1)
+        candidates[:self.n_days_new_high] = False
+        candidates[-1] = False
+        hits = select_with_cooldown(candidates, self.n_days_next_new_high)
+        if len(hits) == 0:
+            return pd.DataFrame(columns=['日期','开盘','收盘','最高','最低','n日最大涨幅','n日最大跌幅'])
+
+        # 之后 next_n_days 天的窗口（含新高当日，末尾不足时截断）
+        base = high[hits]
+        end = np.minimum(hits + self.next_n_days, n_rows) - 1
+        labels = self.df.index[hits]
+        self.df.loc[labels, 'n日后涨跌幅'] = np.round((close[end] / base - 1) * 100, 2)
+        self.df.loc[labels, 'n日最大涨幅'] = np.round((forward_max(high, self.next_n_days)[hits] / base - 1) * 100, 2)
+        self.df.loc[labels, 'n日最大跌幅'] = np.round((forward_min(low, self.next_n_days)[hits] / base - 1) * 100, 2)
+
+        return self.df.loc[labels, ['日期','开盘','收盘','最高','最低','n日后涨跌幅','n日最大涨幅','n日最大跌幅']]
 
     def new_high_next_n_days_analysis(self):
         """
@@ -350,46 +425,16 @@ class StockNewHighAnalysis():
             }     
             return dic
 
-    
-    def n_days_high_low_analysis(self, date: str, n: int = 10) -> tuple:
-        """分析指定日期后n天内的最高价和最低价
-        
-        参数:
-            date (str): 起始日期
-            n (int): 分析的天数范围
-        
-        返回:
-            tuple: 包含n天内开盘价、收盘价、最高价、最低价
-        """
-        try:
-            index = self.df.loc[self.df['日期'] == date].index[0]
-        except IndexError:
-            return "", ""  # 如果日期不在数据中，返回空字符串
-        if index+1 == len(self.df): 
-            return "","",""
-        else:
-            end_index = min(index + n, len(self.df))
-            next_n_days_data = self.df.iloc[index:end_index]
-            print(next_n_days_data)
-            next_n_days_data = DFConvert().safe_convert_numeric(next_n_days_data, ['收盘', '最高', '最低'])
-            #next_n_days_data 最后一日收盘价      
-            #TODO:数据格式不对
-            # n_days_close = float(next_n_days_data.iloc[-1]['收盘'])
-            # n_days_high = float(next_n_days_data['最高'].max())
-            # n_days_low =float(next_n_days_data['最低'].min())
-            # print(n_days_close,n_days_high,n_days_low)
-            n_days_close = round((float(next_n_days_data.iloc[-1]['收盘'])/float(next_n_days_data.iloc[0]['最高'])-1)*100,2)
-            n_days_high = round((float(next_n_days_data['最高'].max())/float(next_n_days_data.iloc[0]['最高'])-1)*100,2)
-            n_days_low = round((float(next_n_days_data['最低'].min())/float(next_n_days_data.iloc[0]['最高'])-1)*100,2)
-            return n_days_close,n_days_high,n_days_low
-
 
 class StockARealTimeData():
     """A股实时数据处理类"""
+    def __init__(self, provider: Optional[MarketDataProvider] = None):
+        self.provider = provider or get_provider()
+
     def get_realtime_data(self) -> pd.DataFrame:
         """获取实时行情数据"""
         try:
-            df = ak.stock_zh_a_spot_em()
+            df = self.provider.get_spot()
             if df.empty:
                 raise ValueError("获取实时数据失败")
             return df
@@ -400,60 +445,153 @@ class StockARealTimeData():
 
 class StockDataAnalyzer:
     """股票数据分析类"""
-    def __init__(self, output_dir: str = "output"):
+    def __init__(self, output_dir: str = "output", recorder: Optional[SnapshotRecorder] = None,
+                 realtime_source=None, history_factory: Callable = None, clock: Optional[SystemClock] = None,
+                 screener: Optional[Screener] = None):
+        """
+        Args:
+            output_dir: 结果输出目录
+            recorder: 快照记录器，提供时每个实时快照都会写入快照日志
+            realtime_source: 实时行情来源，需提供 get_realtime_data()，默认为 StockARealTimeData
+            history_factory: 创建历史数据对象的函数，返回对象需提供 last_trade_date 和
+                get_history_max_price()，默认为 StockAHistoryData
+            clock: 时钟，决定当前对应的交易日及是否需要重新加载历史数据
+            screener: 筛选规则，默认读取配置 [Screen.Rules]，第一条规则的结果用于提醒
+        """
         self.output_dir = Path(output_dir)
-        self.output_dir.mkdir(exist_ok=True)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.recorder = recorder
+        self.realtime_source = realtime_source or StockARealTimeData()
+        self.clock = clock or default_clock
+        self.history_factory = history_factory or partial(StockAHistoryData, clock=self.clock)
+        self.screener = screener or Screener.from_config()
+        # 实时快照缓冲区，只对发生变化的股票重新筛选；规则引用的列变化时也需要重新筛选
+        fields = list(dict.fromkeys([*SnapshotRingBuffer.DEFAULT_FIELDS, *sorted(self.screener.columns)]))
+        self.snapshot_buffer = SnapshotRingBuffer(fields=fields, code_column='股票代码')
+        # 实际求值的规则：配置的规则加上历史数据中每个新高窗口的突破规则
+        self.active_screener = self.screener
+        self._passed_codes: Dict[str, set] = {name: set() for name in self.screener.names}
+        self._latest_df = pd.DataFrame()
+        self._trade_date: Optional[str] = None
+        # 历史数据在交易日内不变，按最后交易日加载一次（非交易日和跨越午夜时不会误判）
+        self.history_index: Optional[HistoryIndex] = None
+        self._history_trade_date: Optional[str] = None
+
+    def current_trade_date(self) -> str:
+        """按时钟的当前时间计算历史数据对应的最后交易日（当日收盘前为前一个交易日）"""
+        now = self.clock.now()
+        return get_trading_calendar(MARKET_CODES["A"], now.year).last_trade_date(now)
+
+    def current_session(self, now: Optional[datetime] = None) -> str:
+        """当前时间所在的交易日，非交易日为之前最近的交易日，实时快照按该交易日分区记录"""
+        now = now or self.clock.now()
+        return get_trading_calendar(MARKET_CODES["A"], now.year).previous_session(now, 0)
+
+    def load_history(self, force: bool = False) -> HistoryIndex:
+        """加载历史最高价数据，最后交易日不变时直接返回已加载的数据
+
+        Args:
+            force: 是否强制重新加载
+
+        Returns:
+            HistoryIndex: 按股票代码索引的历史数据
+        """
+        trade_date = self.current_trade_date()
+        if not force and self.history_index is not None and self._history_trade_date == trade_date:
+            return self.history_index
+
+        history_data = self.history_factory()
+        max_price_df = history_data.get_history_max_price()
+        if max_price_df.empty:
+            raise ValueError("未能获取历史价格数据")
+
+        self.history_index = HistoryIndex(max_price_df, history_data.last_trade_date)
+        self._history_trade_date = trade_date
+        window_rules = {
+            f'{w}日新高': ScreenRule(f'{w}日新高', f"`{w}日最高` > 0 and 最高 >= `{w}日最高`")
+            for w in self.history_index.windows
+        }
+        self.active_screener = Screener({**self.screener.rules, **window_rules})
+
+        # 历史数据变化后所有股票都需要重新筛选；交易日切换时之前的筛选结果作废
+        self.snapshot_buffer.clear()
+        if history_data.last_trade_date != self._trade_date:
+            self._passed_codes = {}
+            self._trade_date = history_data.last_trade_date
+        self._passed_codes = {name: self._passed_codes.get(name, set()) for name in self.active_screener.names}
+        logger.info(f"历史数据已加载: 交易日 {self._trade_date}, {len(self.history_index)} 只股票")
+        return self.history_index
+
+    def _build_result(self, codes: set) -> pd.DataFrame:
+        """用最新快照中指定股票的行生成结果，按流通市值降序"""
+        if not codes or self._latest_df.empty:
+            return pd.DataFrame()
+        realtime_df = self._latest_df
+        result_df = self.history_index.align(realtime_df[realtime_df['股票代码'].isin(codes)])
+        result_df = DFConvert().safe_convert_numeric(result_df, ['历史最高', '最高', '流通市值'])
+        # 标记各新高窗口的突破
+        for window in self.history_index.windows:
+            result_df[f'{window}日新高'] = result_df['股票代码'].isin(self._passed_codes.get(f'{window}日新高', ()))
+        return result_df.sort_values('流通市值', ascending=False).reset_index(drop=True)
+
+    def distance_to_high(self) -> np.ndarray:
+        """最新快照中各股票距主窗口历史最高价的比例（历史最高/最高-1），小于等于0表示已创新高"""
+        if self.history_index is None or self._latest_df.empty:
+            return np.empty(0)
+        positions = self.history_index.positions(self._latest_df['股票代码'])
+        matched = positions >= 0
+        history_high = self.history_index.values('历史最高')[positions[matched]]
+        high = pd.to_numeric(self._latest_df['最高'], errors='coerce').to_numpy(dtype=np.float64)[matched]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            distance = history_high / high - 1
+        return distance[np.isfinite(distance)]
+
+    def get_rule_results(self) -> Dict[str, pd.DataFrame]:
+        """获取最近一次检查中每条筛选规则（包括各新高窗口的突破规则 N日新高）的结果"""
+        return {name: self._build_result(codes) for name, codes in self._passed_codes.items()}
 
     def process_and_analyze(self) -> pd.DataFrame:
         try:
-            # 获取历史数据
-            history_data = StockAHistoryData()
-            max_price_df = history_data.get_history_max_price()
-            
-            if max_price_df.empty:
-                raise ValueError("未能获取历史价格数据")
+            # 获取历史数据（每个交易日只加载一次）
+            history_index = self.load_history()
 
             # 获取实时数据
-            realtime_data = StockARealTimeData()
-            realtime_df = realtime_data.get_realtime_data()
+            realtime_df = self.realtime_source.get_realtime_data()
             
             if realtime_df.empty:
                 raise ValueError("未能获取实时数据")
 
+            # 记录原始快照，写盘在后台线程完成
+            if self.recorder is not None:
+                now = self.clock.now()
+                self.recorder.record(realtime_df, timestamp=now.timestamp(), trade_date=self.current_session(now))
+
             # 合并数据前确保列名一致
             realtime_df = realtime_df.rename(columns={'代码': '股票代码'})
-            
-            # 合并数据
-            result_df = pd.merge(
-                max_price_df,
-                realtime_df,
-                on='股票代码',
-                how='inner'
-            )
 
-            # 转换数据类型并处理异常值
-            numeric_columns = ['历史最高', '最高', '流通市值']
-            result_df = DFConvert().safe_convert_numeric(result_df, numeric_columns)
-            
-            # 移除异常值
-            result_df = result_df[result_df['历史最高'] > 0]
-            result_df = result_df[result_df['最高'] > 0]
-            result_df = result_df[result_df['流通市值'] > 0]
-
-            # 筛选数据
-            filtered_df = result_df[
-                (result_df['历史最高'] <= result_df['最高']) &
-                (result_df['流通市值'] > 1e10)
-            ].copy()
-
-            if filtered_df.empty:
+            # 只对价格、最高价或市值有变化的股票重新筛选
+            changed = self.snapshot_buffer.push(realtime_df)
+            changed_df = realtime_df[changed]
+            changed_codes = set(changed_df['股票代码'].astype(str))
+            current_codes = set(realtime_df['股票代码'].astype(str))
+
+            # 所有筛选规则和各新高窗口在对齐后的数据上一次求值
+            aligned_df = history_index.align(changed_df)
+            aligned_codes = aligned_df['股票代码'].to_numpy()
+            for name, mask in self.active_screener.evaluate(aligned_df).items():
+                passed = set(aligned_codes[mask])
+                self._passed_codes[name] = ((self._passed_codes[name] - changed_codes) | passed) & current_codes
+            self._latest_df = realtime_df
+
+            primary_codes = self._passed_codes[self.screener.primary]
+            logger.debug(f"本次变化 {len(changed_codes)} 只股票，符合条件 {len(primary_codes)} 只")
+
+            if not primary_codes:
                 logger.warning("筛选后没有符合条件的数据")
                 return pd.DataFrame()
 
-            # 排序
-            filtered_df = filtered_df.sort_values('流通市值', ascending=False).reset_index(drop=True)
-
-            return filtered_df
+            # 输出使用最新快照中符合主规则的行
+            return self._build_result(primary_codes)
 
         except Exception as e:
             logger.error(f"数据处理和分析失败: {str(e)}")
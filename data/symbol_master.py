@@ -0,0 +1,87 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class SymbolMaster:
+    """股票代码主表，提供代码、名称与交易所前缀之间的哈希查找"""
+    def __init__(self, stock_list: Optional[pd.DataFrame] = None, trade_date: Optional[str] = None):
+        self.trade_date: Optional[str] = None
+        self.codes = np.array([], dtype=object)
+        self.names = np.array([], dtype=object)
+        self._code_to_name: Dict[str, str] = {}
+        self._name_to_code: Dict[str, str] = {}
+        self._code_to_prefix: Dict[str, str] = {}
+        if stock_list is not None:
+            self.build(stock_list, trade_date)
+
+    def build(self, stock_list: pd.DataFrame, trade_date: Optional[str] = None) -> None:
+        """根据股票列表（包含 code、name 列）建立索引"""
+        codes = stock_list['code'].astype(str).to_numpy(dtype=object)
+        names = stock_list['name'].astype(str).to_numpy(dtype=object)
+        code_to_name = dict(zip(codes, names))
+        # 先整体建好再替换，其他线程读取时不会看到一半的索引
+        self._name_to_code = dict(zip(names, codes))
+        self._code_to_prefix = {code: self.exchange_prefix(code) for code in codes}
+        self._code_to_name = code_to_name
+        self.codes, self.names = codes, names
+        self.trade_date = trade_date
+
+    def is_built_for(self, trade_date: str) -> bool:
+        """是否已经用指定交易日的股票列表建立过索引"""
+        return bool(self._code_to_name) and self.trade_date == trade_date
+
+    @staticmethod
+    def exchange_prefix(code: str) -> str:
+        """根据股票代码判断交易所前缀: 6开头为上证，4、8、92开头为北交所，其余为深证"""
+        code = str(code)
+        if code.startswith('6'):
+            return 'SH'
+        if code.startswith(('4', '8', '92')):
+            return 'BJ'
+        return 'SZ'
+
+    def get_name(self, code: str) -> Optional[str]:
+        return self._code_to_name.get(str(code))
+
+    def get_code(self, name: str) -> Optional[str]:
+        return self._name_to_code.get(name)
+
+    def get_prefix(self, code: str) -> str:
+        code = str(code)
+        prefix = self._code_to_prefix.get(code)
+        return prefix if prefix is not None else self.exchange_prefix(code)
+
+    def resolve(self, code_or_name: str) -> Optional[Tuple[str, str]]:
+        """输入股票代码或名称，返回 (股票代码, 股票名称)，找不到时返回None"""
+        name = self._code_to_name.get(str(code_or_name))
+        if name is not None:
+            return str(code_or_name), name
+        code = self._name_to_code.get(code_or_name)
+        if code is not None:
+            return code, code_or_name
+        return None
+
+    def __contains__(self, code: str) -> bool:
+        return str(code) in self._code_to_name
+
+    def __len__(self) -> int:
+        return len(self._code_to_name)
+
+
+_shared_master = SymbolMaster()
+_shared_lock = threading.Lock()
+
+
+def get_symbol_master(stock_list: Optional[pd.DataFrame] = None, trade_date: Optional[str] = None) -> SymbolMaster:
+    """获取进程内共享的股票主表
+
+    传入股票列表且该交易日尚未建立索引时建立一次，之后各处直接复用。
+    """
+    if stock_list is not None and not _shared_master.is_built_for(trade_date):
+        with _shared_lock:
+            if not _shared_master.is_built_for(trade_date):
+                _shared_master.build(stock_list, trade_date)
+    return _shared_master
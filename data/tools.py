@@ -1,6 +1,14 @@
-from datetime import timezone
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import date, datetime, timezone
 from pathlib import Path
-from typing import Any, Optional, Dict, Union, List, Callable
+from typing import Any, Optional, Dict, Union, List, Callable, Hashable, NamedTuple, Tuple
 import pandas as pd
 import logging
 from functools import wraps
@@ -15,9 +23,90 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 缓存文件格式及扩展名，parquet/feather 依赖 pyarrow，未安装时回退到 csv
+CACHE_FORMATS = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "feather": ".feather",
+}
+
+try:
+    import pyarrow  # noqa: F401
+    _DEFAULT_CACHE_FORMAT = "parquet"
+except ImportError:
+    _DEFAULT_CACHE_FORMAT = "csv"
+
+
 class DataPathManager:
     """数据路径管理类"""
     BASE_PATH = Path("D:/my_stock_data")
+    CACHE_FORMAT = _DEFAULT_CACHE_FORMAT
+
+    @classmethod
+    def set_cache_format(cls, cache_format: str) -> None:
+        """设置缓存文件格式: csv / parquet / feather"""
+        if cache_format not in CACHE_FORMATS:
+            raise ValueError(f"不支持的缓存格式: {cache_format}")
+        if cache_format != "csv":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ValueError(f"缓存格式 {cache_format} 需要安装 pyarrow")
+        cls.CACHE_FORMAT = cache_format
+
+    @classmethod
+    def get_extension(cls) -> str:
+        """获取当前缓存格式对应的扩展名"""
+        return CACHE_FORMATS[cls.CACHE_FORMAT]
+
+    @classmethod
+    def read_cache(cls, file_path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """按文件扩展名读取缓存文件
+
+        Args:
+            file_path: 缓存文件路径
+            columns: 只读取指定的列，None表示读取全部列
+
+        Returns:
+            pd.DataFrame: 缓存数据，parquet/feather 保留原始的数值与日期类型
+        """
+        suffix = Path(file_path).suffix
+        if suffix == CACHE_FORMATS["parquet"]:
+            return pd.read_parquet(file_path, columns=columns)
+        if suffix == CACHE_FORMATS["feather"]:
+            return pd.read_feather(file_path, columns=columns)
+        return pd.read_csv(file_path, dtype=object, usecols=columns)
+
+    @classmethod
+    def write_cache(cls, df: pd.DataFrame, file_path: Path) -> None:
+        """按文件扩展名写入缓存文件
+
+        先写入同目录下的临时文件再替换目标文件，读取方只会看到完整的旧文件或新文件。
+        """
+        file_path = Path(file_path)
+        suffix = file_path.suffix
+        tmp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}_{threading.get_ident()}.tmp")
+        try:
+            if suffix == CACHE_FORMATS["parquet"]:
+                df.to_parquet(tmp_path, index=False)
+            elif suffix == CACHE_FORMATS["feather"]:
+                df.reset_index(drop=True).to_feather(tmp_path)
+            else:
+                df.to_csv(tmp_path, index=False)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def export_csv(cls, file_path: Path, output_path: Optional[Path] = None) -> Path:
+        """将缓存文件导出为csv，默认导出到缓存文件同目录"""
+        file_path = Path(file_path)
+        output_path = Path(output_path) if output_path else file_path.with_suffix(CACHE_FORMATS["csv"])
+        df = cls.read_cache(file_path)
+        df.to_csv(output_path, index=False, encoding='utf-8-sig')
+        logger.info(f"缓存已导出: {output_path}")
+        return output_path
 
     @classmethod
     def ensure_base_path(cls) -> None:
@@ -29,15 +118,204 @@ class DataPathManager:
         """获取完整文件路径"""
         return cls.BASE_PATH / filename
 
+class BatchCheckpoint:
+    """分批任务的断点记录
+
+    每完成一批就把已完成的批次数和累计结果写入检查点文件（先写临时文件再替换），
+    中断后在同一交易日重新运行时从最后完成的批次继续。
+    每个任务只有一个检查点文件，文件中记录交易日期，其他交易日的检查点直接被覆盖，无需查找清理。
+    """
+    def __init__(self, name: str, trade_date: str, batch_size: int):
+        self.name = name
+        self.trade_date = trade_date
+        self.batch_size = batch_size
+        self.file_path = DataPathManager.get_file_path(f"{name}_checkpoint.json")
+
+    def load(self) -> tuple[int, List[Any], int]:
+        """读取检查点，返回 (已完成的批次数, 累计结果, 失败数)，无有效检查点时返回 (0, [], 0)"""
+        if not self.file_path.exists():
+            return 0, [], 0
+        try:
+            with open(self.file_path, "r", encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            if checkpoint.get("trade_date") != self.trade_date:
+                logger.info(f"检查点属于交易日 {checkpoint.get('trade_date')}，重新开始")
+                return 0, [], 0
+            if checkpoint.get("batch_size") != self.batch_size:
+                logger.warning(f"检查点批次大小不一致，忽略检查点: {self.file_path.name}")
+                return 0, [], 0
+            return int(checkpoint["completed_batches"]), checkpoint["results"], int(checkpoint.get("error_count", 0))
+        except Exception as e:
+            logger.warning(f"读取检查点失败，重新开始: {e}")
+            return 0, [], 0
+
+    def save(self, completed_batches: int, results: List[Any], error_count: int = 0) -> None:
+        """保存检查点，覆盖之前交易日的检查点"""
+        DataPathManager.ensure_base_path()
+        tmp_path = self.file_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump({
+                "trade_date": self.trade_date,
+                "batch_size": self.batch_size,
+                "completed_batches": completed_batches,
+                "error_count": error_count,
+                "results": results,
+            }, f, ensure_ascii=False)
+        tmp_path.replace(self.file_path)
+
+    def clear(self) -> None:
+        """任务完成后删除检查点"""
+        self.file_path.unlink(missing_ok=True)
+
+
+class MemoryCache:
+    """进程内的 LRU 缓存，位于磁盘缓存之前
+
+    按 DataFrame 占用的内存字节数限制总大小，超出 max_bytes 时淘汰最久未使用的数据。
+    缓存的数据属于某个交易日，交易日变化时全部失效。读取时返回副本，调用方修改不会影响缓存。
+    """
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.trade_date: Optional[str] = None
+        self._entries: "OrderedDict[Hashable, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
     @classmethod
-    def clean_old_files(cls, pattern: str) -> None:
-        """清理匹配模式的旧文件"""
-        for file in cls.BASE_PATH.glob(pattern):
-            try:
-                file.unlink()
-                logger.debug(f"已删除旧文件: {file}")
-            except Exception as e:
-                logger.warning(f"删除文件失败 {file}: {e}")
+    def from_config(cls, config: Optional[ConfigTools] = None, section: str = "Cache.Settings") -> "MemoryCache":
+        """从配置文件创建，memory_budget_mb 未配置时为 256MB，为 0 时不使用内存缓存"""
+        config = config or ConfigTools()
+        budget_mb = float(config.get_config(section, "memory_budget_mb", 256))
+        return cls(max_bytes=int(budget_mb * 1024 * 1024))
+
+    def check_trade_date(self, trade_date: str) -> None:
+        """交易日变化时清空缓存"""
+        if trade_date == self.trade_date:
+            return
+        with self._lock:
+            if trade_date != self.trade_date:
+                if self._entries:
+                    logger.info(f"交易日变化为 {trade_date}，清空内存缓存")
+                self._clear()
+                self.trade_date = trade_date
+
+    def get(self, key: Hashable) -> Optional[pd.DataFrame]:
+        """读取缓存，不存在时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return entry[0].copy()
+
+    def put(self, key: Hashable, df: pd.DataFrame) -> None:
+        """写入缓存，单个数据超过总大小时不缓存"""
+        if not isinstance(df, pd.DataFrame):
+            return
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+        df = df.copy()
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (df, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def clear(self) -> None:
+        """清空缓存，统计计数保留"""
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """命中、未命中、淘汰次数和当前占用"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+class SingleFlight:
+    """合并同一个键的并发请求
+
+    第一个请求的线程负责执行，同一个键在执行期间的其他请求等待同一个 Future，
+    得到相同的结果或异常，避免重复调用接口和同时写同一个缓存文件。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def begin(self, key: Hashable) -> Tuple[bool, Future]:
+        """开始请求，返回 (是否由当前线程执行, Future)
+
+        已在执行中的键由其他线程发起时返回 False，调用方等待 Future；同一线程重入时重新执行，避免死锁。
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None and future.owner != threading.get_ident():
+                self.coalesced += 1
+                future.waiters += 1
+                return False, future
+            future = Future()
+            future.owner = threading.get_ident()
+            future.waiters = 0
+            self._calls[key] = future
+            self.leaders += 1
+            return True, future
+
+    def end(self, key: Hashable, future: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """结束请求并唤醒等待的线程，之后的请求重新执行（通常命中缓存）"""
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'leaders': self.leaders, 'coalesced': self.coalesced, 'in_flight': len(self._calls)}
+
+
+_single_flight = SingleFlight()
+
+_memory_cache: Optional[MemoryCache] = None
+_memory_cache_lock = threading.Lock()
+
+
+def get_memory_cache() -> MemoryCache:
+    """获取文件缓存装饰器共用的内存缓存，首次调用时按配置 [Cache.Settings] 创建"""
+    global _memory_cache
+    if _memory_cache is None:
+        with _memory_cache_lock:
+            if _memory_cache is None:
+                _memory_cache = MemoryCache.from_config()
+    return _memory_cache
+
 
 def create_filename(func_name: str, args: tuple, kwargs: dict, trade_date: str = "") -> str:
     """生成统一的文件名
@@ -62,15 +340,243 @@ def create_filename(func_name: str, args: tuple, kwargs: dict, trade_date: str =
     
     # 如果提供了交易日期，则添加到文件名中
     if trade_date:
-        return f"{base_name}_{trade_date}.csv"
+        return f"{base_name}_{trade_date}{DataPathManager.get_extension()}"
     return base_name
 
 
+class CacheEntry(NamedTuple):
+    """缓存索引中的一条记录"""
+    key: str
+    func: str
+    file: str
+    trade_date: str
+    size: int
+    schema: Optional[Dict[str, str]]
+
+
+class CacheManifest:
+    """缓存文件索引
+
+    用 SQLite 记录每个缓存键对应的文件名、交易日期、文件大小和列类型，查找、判断是否过期和清理
+    都是一次索引查询，不需要在保存大量缓存文件的目录中执行 glob。
+    同一个缓存键写入新文件时直接删除索引中记录的旧文件。
+
+    首次创建索引时扫描一次数据目录，把之前按文件名缓存的文件登记为以基础文件名为键的遗留记录，
+    之后缓存键第一次访问时改为规范化的缓存键，未命中时不再扫描目录。
+    """
+    FILE_NAME = "cache_manifest.sqlite"
+    LEGACY_PREFIX = "legacy:"
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path) if db_path else DataPathManager.get_file_path(self.FILE_NAME)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            # WAL 模式下监控程序和看板等多个进程可以同时读写
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "key TEXT PRIMARY KEY, func TEXT NOT NULL, file TEXT NOT NULL, trade_date TEXT NOT NULL, "
+                "size INTEGER NOT NULL, schema TEXT, updated REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_trade_date ON cache_entries (trade_date)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS manifest_meta (name TEXT PRIMARY KEY, value TEXT)")
+            imported = self._conn.execute(
+                "SELECT value FROM manifest_meta WHERE name = 'legacy_imported'"
+            ).fetchone()
+            if imported is None:
+                self._import_legacy_files()
+                self._conn.execute("INSERT INTO manifest_meta (name, value) VALUES ('legacy_imported', ?)",
+                                   (str(time.time()),))
+
+    def _import_legacy_files(self) -> None:
+        """扫描一次数据目录，登记建立索引之前的缓存文件
+
+        文件名为 基础文件名_交易日期.扩展名，同一基础文件名只保留交易日期最新的文件，其余删除。
+        """
+        extensions = set(CACHE_FORMATS.values())
+        latest: Dict[str, Tuple[str, os.DirEntry]] = {}
+        stale: List[Path] = []
+        with os.scandir(self.db_path.parent) as entries:
+            for dir_entry in entries:
+                stem, extension = os.path.splitext(dir_entry.name)
+                base_name, _, trade_date = stem.rpartition("_")
+                if extension not in extensions or not base_name or len(trade_date) != 8 \
+                        or not trade_date.isdigit() or not dir_entry.is_file():
+                    continue
+                previous = latest.get(base_name)
+                if previous is None or previous[0] < trade_date:
+                    if previous is not None:
+                        stale.append(Path(previous[1].path))
+                    latest[base_name] = (trade_date, dir_entry)
+                else:
+                    stale.append(Path(dir_entry.path))
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO cache_entries (key, func, file, trade_date, size, schema, updated) "
+            "VALUES (?, ?, ?, ?, ?, NULL, ?)",
+            [(self.LEGACY_PREFIX + base_name, base_name, dir_entry.name, trade_date, dir_entry.stat().st_size, now)
+             for base_name, (trade_date, dir_entry) in latest.items()]
+        )
+        for file in stale:
+            self._unlink(file)
+        if latest:
+            logger.info(f"缓存索引已登记 {len(latest)} 个之前的缓存文件，删除 {len(stale)} 个旧文件")
+
+    @staticmethod
+    def _canonical(value: Any) -> Any:
+        """把参数转换为可稳定序列化的形式，不支持的类型抛出 TypeError"""
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, (list, tuple)):
+            return [CacheManifest._canonical(item) for item in value]
+        if isinstance(value, dict):
+            return {str(k): CacheManifest._canonical(v) for k, v in sorted(value.items(), key=lambda item: str(item[0]))}
+        raise TypeError(f"无法为 {type(value).__name__} 类型的参数生成缓存键")
+
+    @classmethod
+    def make_key(cls, func_name: str, args: tuple = (), kwargs: Optional[dict] = None) -> str:
+        """由函数名和参数生成规范化的缓存键（sha1），关键字参数与顺序无关"""
+        payload = json.dumps(
+            [func_name, cls._canonical(list(args)), cls._canonical(kwargs or {})],
+            ensure_ascii=False, separators=(",", ":")
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        """查找缓存键对应的记录"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, func, file, trade_date, size, schema FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(*row[:5], json.loads(row[5]) if row[5] else None)
+
+    def adopt_legacy(self, key: str, func_name: str, base_filename: str) -> Optional[CacheEntry]:
+        """把基础文件名对应的遗留记录改为规范化的缓存键，没有遗留记录时返回None"""
+        with self._lock, self._conn:
+            updated = self._conn.execute(
+                "UPDATE OR REPLACE cache_entries SET key = ?, func = ? WHERE key = ?",
+                (key, func_name, self.LEGACY_PREFIX + base_filename)
+            ).rowcount
+        return self.lookup(key) if updated else None
+
+    @staticmethod
+    def is_current(entry: Optional[CacheEntry], trade_date: str, columns: Optional[List[str]] = None) -> bool:
+        """记录是否属于该交易日、使用当前的缓存格式并包含需要读取的列（列类型未知时不检查）"""
+        if entry is None or entry.trade_date != trade_date:
+            return False
+        if Path(entry.file).suffix != DataPathManager.get_extension():
+            return False
+        return not columns or entry.schema is None or all(col in entry.schema for col in columns)
+
+    def record(self, key: str, func_name: str, file_path: Path, trade_date: str,
+               df: Optional[pd.DataFrame] = None) -> None:
+        """记录缓存键对应的新文件，并删除该键之前的缓存文件
+
+        Args:
+            df: 写入的数据，用于记录列类型，None 表示列类型未知
+        """
+        file_path = Path(file_path)
+        schema = json.dumps({str(col): str(dtype) for col, dtype in df.dtypes.items()}, ensure_ascii=False) \
+            if df is not None else None
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT file FROM cache_entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, func, file, trade_date, size, schema, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, func_name, file_path.name, trade_date, file_path.stat().st_size, schema, time.time())
+            )
+        if row is not None and row[0] != file_path.name:
+            self._unlink(self.db_path.parent / row[0])
+
+    def remove(self, key: str) -> None:
+        """删除缓存键的记录（不删除文件）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def gc(self, before_trade_date: str) -> int:
+        """删除交易日期早于 before_trade_date 的缓存文件及记录，返回删除的数量"""
+        with self._lock, self._conn:
+            files = [row[0] for row in self._conn.execute(
+                "SELECT file FROM cache_entries WHERE trade_date < ?", (before_trade_date,)
+            )]
+            self._conn.execute("DELETE FROM cache_entries WHERE trade_date < ?", (before_trade_date,))
+        for file in files:
+            self._unlink(self.db_path.parent / file)
+        if files:
+            logger.info(f"已清理 {len(files)} 个 {before_trade_date} 之前的缓存文件")
+        return len(files)
+
+    def summary(self) -> pd.DataFrame:
+        """按函数和交易日期汇总缓存文件数量和大小"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT func, trade_date, COUNT(*), SUM(size) FROM cache_entries GROUP BY func, trade_date"
+            ).fetchall()
+        return pd.DataFrame(rows, columns=['func', 'trade_date', 'files', 'bytes'])
+
+    @staticmethod
+    def _unlink(file: Path) -> None:
+        try:
+            file.unlink(missing_ok=True)
+            logger.debug(f"已删除旧文件: {file}")
+        except Exception as e:
+            logger.warning(f"删除文件失败 {file}: {e}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_manifests: Dict[Path, CacheManifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def get_cache_manifest() -> CacheManifest:
+    """获取当前数据目录的缓存索引，每个数据目录在进程内只打开一次"""
+    base_path = DataPathManager.BASE_PATH
+    manifest = _manifests.get(base_path)
+    if manifest is None:
+        with _manifests_lock:
+            manifest = _manifests.get(base_path)
+            if manifest is None:
+                manifest = CacheManifest(base_path / CacheManifest.FILE_NAME)
+                _manifests[base_path] = manifest
+    return manifest
+
+
+def _cache_key_args(func: Callable, args: tuple) -> tuple:
+    """去掉方法调用的实例参数，实例不参与缓存键（与文件名一致）"""
+    qualname_parts = func.__qualname__.split(".")
+    if len(qualname_parts) > 1 and qualname_parts[-2] != "<locals>":
+        return args[1:]
+    return args
+
+
+def get_cached_file(func_name: str, args: tuple = (), kwargs: Optional[dict] = None) -> Optional[Path]:
+    """获取缓存键最近一次缓存的文件（可能属于之前的交易日），没有缓存时返回None"""
+    manifest = get_cache_manifest()
+    key = CacheManifest.make_key(func_name, args, kwargs)
+    entry = manifest.lookup(key) or manifest.adopt_legacy(key, func_name, create_filename(func_name, args, kwargs or {}, ""))
+    if entry is None:
+        return None
+    file_path = DataPathManager.get_file_path(entry.file)
+    return file_path if file_path.exists() else None
+
+
 def file_exist_or_get_data_decorator(is_daily_update: bool = True, market: str = "A"):
     """改进的文件缓存装饰器"""
     def decorator(func: Callable[..., Union[pd.DataFrame, Any]]) -> Callable:
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Union[pd.DataFrame, Any]:
+            # cache_columns 只用于缓存读取，不参与文件名，也不传给被装饰函数
+            columns = kwargs.pop('cache_columns', None)
             if not is_daily_update:
                 return func(*args, **kwargs)
 
@@ -89,28 +595,66 @@ def file_exist_or_get_data_decorator(is_daily_update: bool = True, market: str =
                 if not trade_date:
                     raise ValueError("未能获取交易日期")
 
-                # 生成文件名
+                # 生成文件名和缓存键
                 filename = create_filename(func.__name__, args, kwargs, trade_date)
                 file_path = DataPathManager.get_file_path(filename)
+                key = CacheManifest.make_key(func.__name__, _cache_key_args(func, args), kwargs)
 
-                if file_path.exists():
-                    logger.debug(f"从缓存读取数据: {filename}")
-                    return pd.read_csv(file_path, dtype=object)
+                # 先查内存缓存，键包含数据目录、缓存键、交易日期和读取的列
+                memory_cache = get_memory_cache()
+                memory_cache.check_trade_date(trade_date)
+                memory_key = (str(DataPathManager.BASE_PATH), key, trade_date, tuple(columns) if columns else None)
+                df = memory_cache.get(memory_key)
+                if df is not None:
+                    return df
 
-                logger.info(f"获取新数据: {func.__name__}")
-                df = func(*args, **kwargs)
-                if df.empty:
-                    raise ValueError("获取到的数据为空")
+                def load() -> pd.DataFrame:
+                    manifest = get_cache_manifest()
+                    entry = manifest.lookup(key) or manifest.adopt_legacy(
+                        key, func.__name__, create_filename(func.__name__, args, kwargs, ""))
+                    if manifest.is_current(entry, trade_date, columns):
+                        cached_path = DataPathManager.get_file_path(entry.file)
+                        try:
+                            logger.debug(f"从缓存读取数据: {entry.file}")
+                            return DataPathManager.read_cache(cached_path, columns)
+                        except FileNotFoundError:
+                            logger.warning(f"缓存文件已不存在，重新获取: {entry.file}")
+                            manifest.remove(key)
 
-                # 清理旧文件并保存新数据
-                base_filename = create_filename(func.__name__, args, kwargs, "")  # 不包含日期的基础文件名
-                pattern = f"{base_filename}*.csv"
-                DataPathManager.clean_old_files(pattern)
+                    logger.info(f"获取新数据: {func.__name__}")
+                    df = func(*args, **kwargs)
+                    if df.empty:
+                        raise ValueError("获取到的数据为空")
 
-                # 保存新数据
-                df.to_csv(file_path, index=False)
-                logger.info(f"数据已保存: {filename}")
+                    # 先写临时文件再替换并登记到索引，其他线程和进程不会读到写了一半的文件；
+                    # 索引中记录的旧文件随之删除
+                    DataPathManager.write_cache(df, file_path)
+                    manifest.record(key, func.__name__, file_path, trade_date, df)
+                    logger.info(f"数据已保存: {filename}")
+                    return df[columns] if columns else df
 
+                # 同一个键的并发未命中只由一个线程读取或获取，其他线程等待同一个结果
+                flight_key = (str(DataPathManager.BASE_PATH), key, trade_date)
+                is_leader, future = _single_flight.begin(flight_key)
+                if not is_leader:
+                    leader_columns, shared_df = future.result()
+                    if columns and all(col in shared_df.columns for col in columns):
+                        return shared_df[columns].copy()
+                    if not columns and not leader_columns:
+                        return shared_df.copy()
+                    # 需要的列不同，数据此时已写入缓存，直接读取
+                    df = load()
+                else:
+                    try:
+                        df = load()
+                    except BaseException as e:
+                        _single_flight.end(flight_key, future, error=e)
+                        raise
+                    _single_flight.end(flight_key, future, result=(columns, df))
+                    if future.waiters:
+                        # 等待的线程会复制共享的结果，返回副本避免调用方同时修改
+                        df = df.copy()
+                memory_cache.put(memory_key, df)
                 return df
 
             except Exception as e:
@@ -121,12 +665,6 @@ def file_exist_or_get_data_decorator(is_daily_update: bool = True, market: str =
     return decorator
 
 
-def file_exist_or_get_data(func: Callable, decorator_args: List = [1, "A"], *args: Any, **kwargs: Any) -> pd.DataFrame:
-    """改进的文件缓存函数"""
-    is_daily_update, market = decorator_args
-    decorated_func = file_exist_or_get_data_decorator(is_daily_update, market)(func)
-    return decorated_func(*args, **kwargs)
-
 if __name__ == "__main__":
     try:
         # 删除或替换这段代码，因为 TradeDate 类未定义
@@ -0,0 +1,175 @@
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from data.tools import DataPathManager, logger
+
+DateLike = Union[str, date, datetime, pd.Timestamp]
+
+
+def _date_key(value: DateLike) -> int:
+    """日期转换为 YYYYMMDD 整数"""
+    if isinstance(value, str):
+        value = pd.Timestamp(value)
+    return value.year * 10000 + value.month * 100 + value.day
+
+
+def _timestamp(now: Optional[Union[datetime, float]]) -> float:
+    """时间转换为时间戳，naive datetime 按本地时间处理"""
+    if now is None:
+        return datetime.now().timestamp()
+    return now if isinstance(now, (int, float)) else now.timestamp()
+
+
+class TradingCalendar:
+    """预先计算的交易日历
+
+    保存按日期升序的交易日及每个交易日的开盘、收盘时间戳，所有查询都是对有序数组的二分查找。
+    日历按年构建（覆盖上一年至下一年1月），保存到数据目录，同一年内不再重新获取。
+    """
+    def __init__(self, market: str, year: int, sessions: List[int], opens: List[float], closes: List[float]):
+        """
+        Args:
+            market: 交易所代码，如 XSHG
+            year: 日历所属年份
+            sessions: 交易日（YYYYMMDD 整数），升序
+            opens: 各交易日开盘时间戳
+            closes: 各交易日收盘时间戳
+        """
+        self.market = market
+        self.year = year
+        self.sessions = [int(s) for s in sessions]
+        self.opens = [float(t) for t in opens]
+        self.closes = [float(t) for t in closes]
+        if not self.sessions:
+            raise ValueError(f"{market} {year} 年交易日历为空")
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    @staticmethod
+    def get_path(market: str, year: int) -> Path:
+        return DataPathManager.BASE_PATH / "calendar" / f"{market}_{year}.npz"
+
+    @classmethod
+    def build(cls, market: str, year: int, provider=None) -> "TradingCalendar":
+        """从数据提供者获取交易日历"""
+        if provider is None:
+            from data.providers import get_provider
+            provider = get_provider()
+        schedule = provider.get_trade_calendar(market, f"{year - 1}0101", f"{year + 1}0131")
+        if schedule.empty:
+            raise ValueError("未能获取交易日历")
+        sessions = [_date_key(day) for day in schedule.index]
+        opens = [ts.timestamp() for ts in schedule['market_open']]
+        closes = [ts.timestamp() for ts in schedule['market_close']]
+        return cls(market, year, sessions, opens, closes)
+
+    @classmethod
+    def load(cls, market: str, year: int) -> Optional["TradingCalendar"]:
+        """读取保存的日历，不存在或损坏时返回None"""
+        path = cls.get_path(market, year)
+        if not path.exists():
+            return None
+        try:
+            with np.load(path) as data:
+                return cls(market, year, data['sessions'].tolist(), data['opens'].tolist(), data['closes'].tolist())
+        except Exception as e:
+            logger.warning(f"读取交易日历失败，将重新获取: {str(e)}")
+            return None
+
+    def save(self) -> None:
+        """保存日历（先写临时文件再替换）"""
+        path = self.get_path(self.market, self.year)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, sessions=np.asarray(self.sessions, dtype=np.int64),
+                     opens=np.asarray(self.opens), closes=np.asarray(self.closes))
+        tmp_path.replace(path)
+
+    def _check_range(self, position: int) -> int:
+        if position < 0 or position >= len(self.sessions):
+            raise IndexError(f"超出交易日历范围: {self.market} {self.year}")
+        return position
+
+    @staticmethod
+    def _format(session: int) -> str:
+        return f"{session:08d}"
+
+    def is_session(self, day: DateLike) -> bool:
+        """是否为交易日"""
+        key = _date_key(day)
+        position = bisect_left(self.sessions, key)
+        return position < len(self.sessions) and self.sessions[position] == key
+
+    def last_trade_date(self, now: Optional[Union[datetime, float]] = None) -> str:
+        """最近一个已收盘的交易日（YYYYMMDD），当日收盘前为前一个交易日"""
+        position = bisect_right(self.closes, _timestamp(now)) - 1
+        return self._format(self.sessions[self._check_range(position)])
+
+    def next_open(self, now: Optional[Union[datetime, float]] = None) -> datetime:
+        """下一次开盘时间（本地时间）"""
+        position = bisect_right(self.opens, _timestamp(now))
+        return datetime.fromtimestamp(self.opens[self._check_range(position)])
+
+    def session_bounds(self, day: DateLike) -> Optional[Tuple[datetime, datetime]]:
+        """交易日的开盘和收盘时间（本地时间），非交易日返回None"""
+        key = _date_key(day)
+        position = bisect_left(self.sessions, key)
+        if position >= len(self.sessions) or self.sessions[position] != key:
+            return None
+        return datetime.fromtimestamp(self.opens[position]), datetime.fromtimestamp(self.closes[position])
+
+    def is_open(self, now: Optional[Union[datetime, float]] = None) -> bool:
+        """当前是否处于某个交易日的开盘至收盘之间"""
+        timestamp = _timestamp(now)
+        position = bisect_right(self.opens, timestamp) - 1
+        return position >= 0 and timestamp <= self.closes[position]
+
+    def previous_session(self, day: DateLike, n: int = 1) -> str:
+        """day 之前的第 n 个交易日（YYYYMMDD）；n=0 时返回 day 当天或之前最近的交易日"""
+        if n < 0:
+            raise ValueError("n 不能为负数")
+        key = _date_key(day)
+        if n == 0:
+            position = bisect_right(self.sessions, key) - 1
+        else:
+            position = bisect_left(self.sessions, key) - n
+        return self._format(self.sessions[self._check_range(position)])
+
+    def next_session(self, day: DateLike, n: int = 1) -> str:
+        """day 之后的第 n 个交易日（YYYYMMDD）；n=0 时返回 day 当天或之后最近的交易日"""
+        if n < 0:
+            raise ValueError("n 不能为负数")
+        key = _date_key(day)
+        if n == 0:
+            position = bisect_left(self.sessions, key)
+        else:
+            position = bisect_right(self.sessions, key) + n - 1
+        return self._format(self.sessions[self._check_range(position)])
+
+
+_calendars: Dict[Tuple[str, int], TradingCalendar] = {}
+_calendars_lock = threading.Lock()
+
+
+def get_trading_calendar(market: str, year: Optional[int] = None, provider=None) -> TradingCalendar:
+    """获取指定交易所和年份的交易日历，依次使用内存、数据目录中保存的日历，都没有时重新获取并保存"""
+    year = year or datetime.now().year
+    key = (market, year)
+    with _calendars_lock:
+        calendar = _calendars.get(key)
+        if calendar is None:
+            calendar = TradingCalendar.load(market, year)
+            if calendar is None:
+                calendar = TradingCalendar.build(market, year, provider)
+                calendar.save()
+                logger.info(f"交易日历已更新: {market} {year} 年, {len(calendar)} 个交易日")
+            _calendars[key] = calendar
+        return calendar
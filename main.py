@@ -1,17 +1,11 @@
 from utils.stock_monitor import StockMonitor
-from data.stock_data import MarketTimeTools
-import time
+from utils.scheduler import SessionScheduler
 
 def main():
-    monitor = StockMonitor(check_interval=600)  # 每15秒检查一次
-    market_time_tools = MarketTimeTools()
-    monitor.start()
-    while True:
-        if market_time_tools.is_market_time() == 1:
-            monitor.start()
-        else:
-            time.sleep(15)
+    monitor = StockMonitor(check_interval=600)  # 每10分钟检查一次
+    # 调度器等待开盘、处理午间休市，并执行盘前准备和盘后处理
+    SessionScheduler(monitor).run()
 
 if __name__ == "__main__":
     main()
-    
\ No newline at end of file
+    
@@ -1,9 +1,13 @@
+import queue
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional, List, Union
+from typing import Callable, Dict, Optional, List, Union
 import pandas as pd
 from data.tools import logger
+from data.symbol_master import get_symbol_master
 
 class StockReportSender:
     def __init__(self, smtp_server: str, smtp_port: int, sender: str, password: str):
@@ -13,14 +17,21 @@ class StockReportSender:
             sender=sender,
             password=password
         )
+
+    def close(self) -> None:
+        """关闭与邮件服务器的连接"""
+        self.email_sender.close()
         
-    def send_stock_report(self, df: pd.DataFrame, receiver: str, subject: str = None) -> None:
+    def send_stock_report(self, df: pd.DataFrame, receiver: str, subject: str = None) -> bool:
         """发送股票报告
         
         Args:
             df: 股票数据
             receiver: 接收者邮箱
             subject: 自定义邮件标题
+
+        Returns:
+            bool: 是否发送给了全部收件人
         """
         if subject is None:
             subject = "股票监控提醒"
@@ -28,7 +39,7 @@ class StockReportSender:
         try:
             if df.empty:
                 logger.warning("没有数据需要发送")
-                return
+                return False
 
             # 处理收件人列表
             if isinstance(receiver, str):
@@ -53,9 +64,13 @@ class StockReportSender:
                 })
             
             # 发送给每个收件人
+            success = True
             for receiver_email in receivers:
                 if self.email_sender.send_stock_report(receiver_email.strip(), display_df, subject):
                     logger.info(f"邮件发送成功: {receiver_email}")
+                else:
+                    success = False
+            return success
             
         except ValueError as ve:
             logger.error(f"数据处理错误: {str(ve)}")
@@ -63,13 +78,75 @@ class StockReportSender:
             logger.error(f"SMTP错误: {str(smtp_e)}")
         except Exception as e:
             logger.error(f"发送邮件报告失败: {str(e)}")
+        return False
 
 class EmailSender:
-    def __init__(self, smtp_server: str, smtp_port: int, sender: str, password: str):
+    """邮件发送器
+
+    与邮件服务器保持一个登录后的长连接，多封邮件复用同一个连接；
+    连接被服务器断开（如空闲超时）时自动重新连接并重发一次。
+    """
+    def __init__(self, smtp_server: str, smtp_port: int, sender: str, password: str, timeout: float = 30):
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
         self.sender = sender
         self.password = password
+        self.timeout = timeout
+        self._server: Optional[smtplib.SMTP_SSL] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP_SSL:
+        logger.info(f"连接SMTP服务器: {self.smtp_server}:{self.smtp_port}")
+        server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, timeout=self.timeout)
+        try:
+            logger.info("登录SMTP服务器")
+            server.login(self.sender, self.password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _disconnect(self) -> None:
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            self._server.close()
+        self._server = None
+
+    @staticmethod
+    def _is_connection_error(error: Exception) -> bool:
+        """是否为连接断开导致的错误（需要重新连接）"""
+        if isinstance(error, smtplib.SMTPServerDisconnected):
+            return True
+        if isinstance(error, smtplib.SMTPResponseException):
+            # 421: 服务器关闭连接
+            return error.smtp_code == 421
+        # SMTPException 是 OSError 的子类，其他 SMTP 错误不重连
+        return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+    def send_message(self, msg: MIMEMultipart) -> None:
+        """使用长连接发送邮件，连接断开时重新连接并重发一次"""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._server is None:
+                        self._server = self._connect()
+                    self._server.send_message(msg)
+                    return
+                except Exception as e:
+                    if not self._is_connection_error(e):
+                        raise
+                    self._disconnect()
+                    if attempt:
+                        raise
+                    logger.warning(f"SMTP连接已断开，重新连接: {str(e)}")
+
+    def close(self) -> None:
+        """关闭与邮件服务器的连接"""
+        with self._lock:
+            self._disconnect()
 
     def send_stock_report(self, receiver: str, df: pd.DataFrame, subject: Optional[str] = None) -> bool:
         """发送股票报告邮件
@@ -127,20 +204,16 @@ class EmailSender:
             
             msg.attach(MIMEText(html_content, 'html', 'utf-8'))
 
-            logger.info("尝试连接到SMTP服务器")
-            with smtplib.SMTP_SSL(self.smtp_server, self.smtp_port) as server:
-                logger.info("登录SMTP服务器")
-                server.login(self.sender, self.password)
-                logger.info("发送邮件")
-                server.send_message(msg)
-                logger.info("邮件发送成功")
-                return True
+            logger.info("发送邮件")
+            self.send_message(msg)
+            logger.info("邮件发送成功")
+            return True
                 
         except smtplib.SMTPException as smtp_e:
             logger.error(f"SMTP错误: {str(smtp_e)}")
         except Exception as e:
             logger.error(f"发送邮件失败: {str(e)}")
-            return False
+        return False
 
     def _generate_html_table(self, df: pd.DataFrame) -> str:
         """生成带有超链接的HTML表格"""
@@ -150,9 +223,84 @@ class EmailSender:
         return df.to_html(index=False, escape=False)
 
     def _get_stock_prefix(self, stock_code: str) -> str:
-        """根据股票代码返回前缀"""
-        # 假设股票代码以6开头的是上证（SH），其他的是深证（SZ）
-        if stock_code.startswith('6'):
-            return 'SH'
-        else:
-            return 'SZ'
\ No newline at end of file
+        """根据股票代码返回前缀，使用共享的股票主表"""
+        return get_symbol_master().get_prefix(stock_code)
+
+
+class MailDispatcher:
+    """后台发送邮件的队列
+
+    监控循环只把发送任务放入队列，由一个后台线程依次执行，邮件服务器响应慢不会推迟下一次检查。
+    任务抛出异常或返回 False 都计为失败；队列已满时丢弃新任务并记录错误，不阻塞调用方。
+    """
+    def __init__(self, max_queue: int = 100):
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="MailDispatcher", daemon=True)
+                self._thread.start()
+
+    def _worker(self) -> None:
+        while True:
+            name, job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                if job() is False:
+                    self.failed += 1
+                    logger.error(f"{name}失败")
+                else:
+                    self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"{name}失败: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def submit(self, name: str, job: Callable[[], object]) -> bool:
+        """把发送任务放入队列，立即返回是否成功加入"""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((name, job))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.error(f"邮件发送队列已满，丢弃: {name}")
+            return False
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待队列中的任务全部完成，超时返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stop(self, timeout: Optional[float] = 30) -> None:
+        """发送完队列中的邮件后停止后台线程"""
+        if not self.flush(timeout):
+            # 后台线程为守护线程，未完成的任务随进程退出放弃
+            logger.warning(f"邮件发送队列未在 {timeout} 秒内完成，剩余 {self.pending} 封")
+            return
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put((None, None))
+            thread.join(timeout)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.unfinished_tasks
+
+    def stats(self) -> Dict[str, int]:
+        return {'completed': self.completed, 'failed': self.failed, 'dropped': self.dropped, 'pending': self.pending}
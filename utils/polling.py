@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+
+from config.config_manager import ConfigTools
+from config.constants import MARKET_CODES, MARKET_HOURS
+
+
+class AdaptivePollingPolicy:
+    """根据接近历史新高的股票数量和距开盘、收盘的时间调整检查间隔
+
+    间隔 = max_interval / (1 + 接近新高的股票数 / near_scale)，限制在 [min_interval, max_interval]；
+    开盘后和收盘前 edge_minutes 分钟内不超过 edge_interval。没有股票接近新高时使用 max_interval。
+    """
+    def __init__(self, min_interval: float = 15, max_interval: float = 600, near_high_pct: float = 0.02,
+                 near_scale: float = 5, edge_minutes: float = 20, edge_interval: float = 60, market: str = "A"):
+        """
+        Args:
+            min_interval: 最短检查间隔（秒）
+            max_interval: 最长检查间隔（秒）
+            near_high_pct: 最高价距历史最高价在该比例以内（且尚未突破）视为接近新高
+            near_scale: 接近新高的股票数每增加 near_scale 只，间隔缩短为原来的约一半
+            edge_minutes: 开盘后、收盘前的时间窗口（分钟）
+            edge_interval: 开盘后、收盘前的最长检查间隔（秒）
+            market: 市场类型
+        """
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("检查间隔设置不正确")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.near_high_pct = near_high_pct
+        self.near_scale = near_scale
+        self.edge = timedelta(minutes=edge_minutes)
+        self.edge_interval = edge_interval
+        self.time_range = MARKET_HOURS[MARKET_CODES[market]]
+
+    @classmethod
+    def from_config(cls, config: Optional[ConfigTools] = None, section: str = "Polling.Settings",
+                    max_interval: float = 600) -> "AdaptivePollingPolicy":
+        """从配置文件创建，未配置的项使用默认值，max_interval 默认为监控器的检查间隔"""
+        config = config or ConfigTools()
+        kwargs = {"max_interval": max_interval}
+        for key in ("min_interval", "max_interval", "near_high_pct", "near_scale", "edge_minutes", "edge_interval"):
+            value = config.get_config(section, key)
+            if value is not None:
+                kwargs[key] = float(value)
+        kwargs["min_interval"] = min(kwargs.get("min_interval", 15), kwargs["max_interval"])
+        return cls(**kwargs)
+
+    def count_near_high(self, distance_to_high: np.ndarray) -> int:
+        """尚未突破且距历史最高价在 near_high_pct 以内的股票数"""
+        distance = np.asarray(distance_to_high, dtype=np.float64)
+        return int(np.count_nonzero((distance > 0) & (distance <= self.near_high_pct)))
+
+    def is_session_edge(self, now: datetime) -> bool:
+        """是否处于开盘后或收盘前的时间窗口"""
+        session_open = datetime.combine(now.date(), self.time_range[0][0])
+        session_close = datetime.combine(now.date(), self.time_range[-1][1])
+        return session_open <= now < session_open + self.edge or session_close - self.edge <= now <= session_close
+
+    def next_interval(self, now: datetime, near_high_count: int) -> float:
+        """计算下一次检查的间隔（秒）"""
+        interval = self.max_interval / (1 + near_high_count / self.near_scale)
+        if self.is_session_edge(now):
+            interval = min(interval, self.edge_interval)
+        return float(min(max(interval, self.min_interval), self.max_interval))
@@ -0,0 +1,185 @@
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from data.clock import SimulatedClock
+from data.history_index import HistoryIndex
+from data.rolling_high import window_columns
+from data.snapshot_recorder import SnapshotLog, decode_snapshot
+from data.stock_data import StockDataAnalyzer
+from data.tools import DataPathManager, create_filename, get_cached_file, logger
+from utils.stock_monitor import StockMonitor
+
+
+def scale_universe(df: pd.DataFrame, multiplier: int, code_column: str,
+                   price_columns: Sequence[str]) -> pd.DataFrame:
+    """把股票池复制为 multiplier 倍，用于压力测试
+
+    第k份副本的代码加上两位前缀 k，价格列乘以固定系数 1+0.01k。
+    对快照和历史最高价使用相同的规则，副本的新高判断与原股票一致。
+    """
+    if multiplier <= 1:
+        return df
+    frames = [df]
+    for k in range(1, multiplier):
+        replica = df.copy()
+        replica[code_column] = f"{k:02d}" + replica[code_column].astype(str)
+        for col in price_columns:
+            if col in replica.columns:
+                replica[col] = pd.to_numeric(replica[col], errors='coerce') * (1 + 0.01 * k)
+        frames.append(replica)
+    return pd.concat(frames, ignore_index=True)
+
+
+class ReplayRealtimeSource:
+    """从快照日志按模拟时钟返回当时最新的快照"""
+    PRICE_COLUMNS = ('最新价', '最高', '最低', '今开', '昨收')
+
+    def __init__(self, log: SnapshotLog, clock: SimulatedClock, universe_multiplier: int = 1):
+        self.log = log
+        self.clock = clock
+        self.universe_multiplier = universe_multiplier
+        self._index = log.index()
+        self._timestamps = np.asarray(self._index['timestamp'])
+        self._data = np.memmap(log.data_file, dtype=np.uint8, mode='r') if len(self._index) else None
+        self._cached_position = -1
+        self._cached_df = pd.DataFrame()
+        self.fetch_count = 0
+
+    def get_realtime_data(self) -> pd.DataFrame:
+        position = int(np.searchsorted(self._timestamps, self.clock.time(), side='right')) - 1
+        if position < 0:
+            raise ValueError("模拟时间早于第一个快照")
+        self.fetch_count += 1
+        if position != self._cached_position:
+            entry = self._index[position]
+            offset, length = int(entry['offset']), int(entry['length'])
+            df = decode_snapshot(memoryview(self._data[offset:offset + length]))
+            self._cached_df = scale_universe(df, self.universe_multiplier, '代码', self.PRICE_COLUMNS)
+            self._cached_position = position
+        return self._cached_df.copy()
+
+
+class ReplayHistory:
+    """回放时使用的历史数据，替代 StockAHistoryData"""
+    def __init__(self, trade_date: str, max_price_df: pd.DataFrame, universe_multiplier: int = 1):
+        self.last_trade_date = trade_date
+        # 各新高窗口的 N日最高 与历史最高按相同系数缩放，副本的 N日新高 判断与原股票一致
+        windows = HistoryIndex(max_price_df, trade_date).windows
+        price_columns = ['历史最高'] + [window_columns(window)[0] for window in windows]
+        self._max_price_df = scale_universe(max_price_df, universe_multiplier, '股票代码', price_columns)
+
+    def get_history_max_price(self) -> pd.DataFrame:
+        return self._max_price_df
+
+
+class ReplayNotifier:
+    """回放时记录提醒而不发送邮件"""
+    def __init__(self, clock: SimulatedClock):
+        self.clock = clock
+        self.alerts: List[Tuple[datetime, pd.DataFrame]] = []
+
+    def send_alerts(self, df: pd.DataFrame) -> None:
+        self.alerts.append((self.clock.now(), df))
+        logger.info(f"[回放 {self.clock.now():%H:%M:%S}] 提醒 {len(df)} 只股票")
+
+
+def load_cached_max_price(trade_date: str, history_trade_date: Optional[str] = None) -> Tuple[str, pd.DataFrame]:
+    """读取回放交易日之前的历史最高价缓存
+
+    盘中使用的是前一交易日收盘后的数据，缓存的交易日必须早于 trade_date。未指定 history_trade_date 时
+    使用最近一次的缓存（每个缓存键只保留最新的文件），它已是 trade_date 当天或之后的数据时报错。
+
+    Args:
+        trade_date: 回放的交易日
+        history_trade_date: 历史最高价数据对应的交易日
+    """
+    if history_trade_date:
+        file_path = DataPathManager.get_file_path(create_filename("get_history_max_price", (), {}, history_trade_date))
+    else:
+        file_path = get_cached_file("get_history_max_price")
+    if file_path is None or not file_path.exists():
+        raise ValueError("没有找到缓存的历史最高价数据")
+    history_trade_date = file_path.stem.rsplit("_", 1)[-1]
+    if history_trade_date >= trade_date:
+        raise ValueError(f"缓存的历史最高价数据交易日为 {history_trade_date}，不早于回放交易日 {trade_date}，"
+                         f"请通过 max_price_df 传入 {trade_date} 之前的数据")
+    return history_trade_date, DataPathManager.read_cache(file_path)
+
+
+class MonitorReplay:
+    """用记录的快照按倍速回放一个交易日的监控
+
+    StockMonitor 的时间判断和等待都由模拟时钟驱动，每个检查周期照常筛选、生成提醒并写出结果，
+    同时统计每个周期的实际耗时。
+    """
+    def __init__(self, trade_date: str, speed: float = 100.0, check_interval: int = 15,
+                 universe_multiplier: int = 1, max_price_df: Optional[pd.DataFrame] = None,
+                 history_trade_date: Optional[str] = None, output_dir: Union[str, Path] = "output/replay",
+                 snapshot_root: Optional[Union[str, Path]] = None):
+        """
+        Args:
+            trade_date: 回放的交易日（快照日志的分区日期）
+            speed: 回放倍速，0表示不等待、尽快回放
+            check_interval: 检查间隔（模拟秒）
+            universe_multiplier: 股票池放大倍数，用于压力测试
+            max_price_df: 历史最高价数据，默认读取缓存
+            history_trade_date: 历史最高价数据对应的交易日，须早于 trade_date，默认为最近一次的缓存
+            output_dir: 回放结果输出目录，与实盘输出分开
+            snapshot_root: 快照日志目录
+        """
+        self.log = SnapshotLog(trade_date, snapshot_root)
+        timestamps = self.log.timestamps()
+        if len(timestamps) == 0:
+            raise ValueError(f"交易日 {trade_date} 没有记录的快照")
+        self.start_time, self.end_time = float(timestamps[0]), float(timestamps[-1])
+
+        if max_price_df is None:
+            history_trade_date, max_price_df = load_cached_max_price(trade_date, history_trade_date)
+        self.clock = SimulatedClock(self.start_time, speed)
+        self.source = ReplayRealtimeSource(self.log, self.clock, universe_multiplier)
+        history = ReplayHistory(history_trade_date or trade_date, max_price_df, universe_multiplier)
+        self.notifier = ReplayNotifier(self.clock)
+
+        analyzer = StockDataAnalyzer(output_dir=str(output_dir), realtime_source=self.source,
+                                     history_factory=lambda: history, clock=self.clock)
+        self.monitor = StockMonitor(check_interval=check_interval, clock=self.clock,
+                                    analyzer=analyzer, email_notifier=self.notifier)
+        self.monitor.previous_file = Path(output_dir) / "previous_stocks.csv"
+        self.latencies: List[float] = []
+
+    def run(self) -> Dict[str, float]:
+        """回放到最后一个快照，返回耗时统计"""
+        real_start = time.perf_counter()
+        self.monitor.is_running = True
+        while self.clock.time() <= self.end_time:
+            if self.monitor.market_time_tools.is_market_time() == 1:
+                cycle_start = time.perf_counter()
+                self.monitor.check_stocks()
+                self.latencies.append(time.perf_counter() - cycle_start)
+            self.clock.sleep(self.monitor.check_interval)
+        self.monitor.is_running = False
+        return self.get_stats(time.perf_counter() - real_start)
+
+    def get_stats(self, real_seconds: float = 0.0) -> Dict[str, float]:
+        latencies = np.asarray(self.latencies) * 1000
+        stats = {
+            "cycles": len(latencies),
+            "alerts": len(self.notifier.alerts),
+            "fetches": self.source.fetch_count,
+            "simulated_seconds": self.end_time - self.start_time,
+            "real_seconds": real_seconds,
+        }
+        if len(latencies):
+            stats.update({
+                "latency_mean_ms": float(latencies.mean()),
+                "latency_p50_ms": float(np.percentile(latencies, 50)),
+                "latency_p95_ms": float(np.percentile(latencies, 95)),
+                "latency_max_ms": float(latencies.max()),
+            })
+        logger.info(f"回放完成: {stats}")
+        return stats
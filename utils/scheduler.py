@@ -0,0 +1,149 @@
+import math
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from config.constants import MARKET_CODES, MARKET_HOURS
+from data.clock import SystemClock, default_clock
+from data.tools import logger
+from data.trade_calendar import get_trading_calendar
+
+
+class SessionScheduler:
+    """按交易日历驱动监控的调度器
+
+    每个交易日的流程：开盘前 warmup_minutes 分钟执行盘前准备，各交易时段内按计划的时间点执行检查
+    （以时段开始时间为基准，不受每次检查耗时影响，不会累积漂移；监控器可提供自适应间隔），
+    午间休市时等待下午开盘，收盘后 post_close_minutes 分钟执行盘后处理，然后等待下一个交易日。
+    在交易时段中启动时直接从当前时段继续，不会重新开始。
+    """
+    # 长时间等待时每次最多等待的秒数，以便及时响应停止
+    MAX_SLEEP = 60
+
+    def __init__(self, monitor, clock: Optional[SystemClock] = None, market: str = "A",
+                 warmup_minutes: float = 10, post_close_minutes: float = 30):
+        """
+        Args:
+            monitor: 监控器，需提供 check_interval、is_running、start_session()、check_stocks()、end_session()，
+                可选提供 next_check_interval()
+            clock: 时钟，默认使用监控器的时钟
+            market: 市场类型
+            warmup_minutes: 盘前准备提前的分钟数
+            post_close_minutes: 收盘后执行盘后处理的延迟分钟数
+        """
+        if market not in MARKET_CODES:
+            raise ValueError(f"不支持的市场类型: {market}")
+        self.monitor = monitor
+        self.clock = clock or getattr(monitor, "clock", None) or default_clock
+        self.market = MARKET_CODES[market]
+        self.warmup = timedelta(minutes=warmup_minutes)
+        self.post_close = timedelta(minutes=post_close_minutes)
+        self.tick_count = 0
+        self.missed_ticks = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self.monitor.is_running
+
+    def session_periods(self, day: str) -> List[Tuple[datetime, datetime]]:
+        """交易日 day（YYYYMMDD）的各交易时段"""
+        session_date = datetime.strptime(day, '%Y%m%d').date()
+        return [
+            (datetime.combine(session_date, start), datetime.combine(session_date, end))
+            for start, end in MARKET_HOURS[self.market]
+        ]
+
+    def next_session_day(self, now: datetime) -> str:
+        """now 所在或之后的第一个尚未完成盘后处理的交易日"""
+        calendar = get_trading_calendar(self.market, now.year)
+        day = calendar.next_session(now, 0)
+        if now >= self.session_periods(day)[-1][1] + self.post_close:
+            day = calendar.next_session(now, 1)
+        return day
+
+    def _sleep_until(self, target: datetime) -> None:
+        """等待到指定时间，分段等待以便及时响应停止"""
+        target_time = target.timestamp()
+        while self.is_running:
+            remaining = target_time - self.clock.time()
+            if remaining <= 0:
+                return
+            self.clock.sleep(min(remaining, self.MAX_SLEEP))
+
+    def _run_job(self, name: str, job: Callable[[], object]) -> None:
+        try:
+            logger.info(f"执行{name}")
+            job()
+        except Exception as e:
+            logger.error(f"{name}失败: {str(e)}")
+
+    def _check_interval(self) -> float:
+        """下一次检查的间隔，监控器提供 next_check_interval() 时使用自适应间隔"""
+        next_check_interval = getattr(self.monitor, "next_check_interval", None)
+        return next_check_interval() if next_check_interval else self.monitor.check_interval
+
+    def _run_period(self, start: datetime, end: datetime) -> None:
+        """在一个交易时段内按计划时间点执行检查
+
+        第一个时间点按间隔与时段开始时间对齐，之后每个时间点为上一个计划时间点加上当前间隔，
+        与检查实际完成的时间无关，因此不会累积漂移。
+        """
+        anchor, end_time = start.timestamp(), end.timestamp()
+        last_tick = None
+        while self.is_running:
+            now = self.clock.time()
+            if now > end_time:
+                return
+            interval = self._check_interval()
+            if last_tick is None:
+                tick = anchor + max(math.ceil((now - anchor) / interval), 0) * interval
+            else:
+                tick = last_tick + interval
+                # 上一次检查耗时超过间隔时跳过错过的时间点
+                if now > tick:
+                    skipped = math.ceil((now - tick) / interval)
+                    tick += skipped * interval
+                    self.missed_ticks += skipped
+                    logger.warning(f"检查耗时超过间隔，跳过 {skipped} 次检查")
+            if tick > end_time:
+                return
+            self._sleep_until(datetime.fromtimestamp(tick))
+            if not self.is_running:
+                return
+            self._run_job("检查", self.monitor.check_stocks)
+            self.tick_count += 1
+            last_tick = tick
+
+    def run_session(self, day: str) -> None:
+        """运行一个交易日：盘前准备、各交易时段的检查和盘后处理"""
+        periods = self.session_periods(day)
+        self._sleep_until(periods[0][0] - self.warmup)
+        if not self.is_running:
+            return
+        self._run_job(f"盘前准备 {day}", self.monitor.start_session)
+
+        for start, end in periods:
+            if self.clock.now() < start:
+                logger.info(f"等待交易时段开始: {start:%H:%M}")
+            self._sleep_until(start)
+            self._run_period(start, end)
+            if not self.is_running:
+                return
+
+        self._sleep_until(periods[-1][1] + self.post_close)
+        if self.is_running:
+            self._run_job(f"盘后处理 {day}", self.monitor.end_session)
+
+    def run(self, max_sessions: Optional[int] = None) -> None:
+        """持续运行，直到监控器停止或完成 max_sessions 个交易日"""
+        self.monitor.is_running = True
+        sessions = 0
+        try:
+            while self.is_running and (max_sessions is None or sessions < max_sessions):
+                day = self.next_session_day(self.clock.now())
+                logger.info(f"下一个交易日: {day}")
+                self.run_session(day)
+                sessions += 1
+        except KeyboardInterrupt:
+            logger.info("收到中断信号")
+        finally:
+            self.monitor.stop()
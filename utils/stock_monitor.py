@@ -1,16 +1,23 @@
+import time
+from collections import deque
 from pathlib import Path
+import numpy as np
 import pandas as pd
-import time
-from datetime import datetime
-from typing import Set
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Dict, Optional, Set, Tuple
 
 from config.constants import A_MARKET_HOURS
 from data.stock_data import StockDataAnalyzer
-from utils.email_sender import StockReportSender
+from data.snapshot_recorder import SnapshotRecorder
+from data.clock import SystemClock, default_clock
+from utils.email_sender import MailDispatcher, StockReportSender
 from config.config_manager import ConfigTools
-from data.tools import logger
+from data.tools import get_cache_manifest, logger
 import streamlit as st
 from data.stock_data import TradeDateTools,MarketTimeTools
+from utils.scheduler import SessionScheduler
+from utils.polling import AdaptivePollingPolicy
 
 # 添加常量配置在文件开头
 OUTPUT_DIR = Path("output")
@@ -22,24 +29,43 @@ OUTPUT_FILES = {
 
 class StockMonitor:
     """股票监控类"""
-    def __init__(self, check_interval: int = 15):
+    def __init__(self, check_interval: int = 15, clock: Optional[SystemClock] = None,
+                 analyzer: Optional[StockDataAnalyzer] = None, email_notifier: Optional["EmailNotifier"] = None,
+                 polling: Optional[AdaptivePollingPolicy] = None):
         """
         初始化监控器
         
         Args:
-            check_interval: 检查间隔（秒）
+            check_interval: 检查间隔（秒），使用自适应间隔时为最长间隔
+            clock: 时钟，回放时传入模拟时钟
+            analyzer: 数据分析器，默认创建带快照记录的分析器
+            email_notifier: 提醒发送器，需提供 send_alerts(df)，默认发送邮件
+            polling: 自适应检查间隔策略，默认读取配置 [Polling.Settings]
         """
         # 初始化属性
         self.check_interval = check_interval
-        self.analyzer = StockDataAnalyzer()
+        self.clock = clock or default_clock
+        if analyzer is None:
+            self.recorder = SnapshotRecorder()
+            self.analyzer = StockDataAnalyzer(recorder=self.recorder, clock=self.clock)
+        else:
+            self.recorder = analyzer.recorder
+            self.analyzer = analyzer
         self.config = ConfigTools()
         self.previous_stocks: Set[str] = set()
         self.previous_file = OUTPUT_FILES['previous_stocks']
         self.is_running = False
-        self.email_notifier = EmailNotifier(self.config)
+        self.email_notifier = email_notifier or EmailNotifier(self.config)
         self._last_check_time = None
         self._current_data = None
-        self.market_time_tools = MarketTimeTools()
+        self._session_day = None
+        self.market_time_tools = MarketTimeTools(clock=self.clock)
+        self.polling = polling or AdaptivePollingPolicy.from_config(self.config, max_interval=check_interval)
+        # 检查统计，用于调整检查间隔策略
+        self.fetch_count = 0
+        self.latencies = deque(maxlen=200)
+        self.near_high_count = 0
+        self.current_interval = float(check_interval)
 
     def _ensure_output_dir(self) -> None:
         """确保输出目录存在"""
@@ -68,7 +94,7 @@ class StockMonitor:
 
     def get_latest_data(self) -> pd.DataFrame:
         """获取最新分析数据，带缓存机制"""
-        current_time = time.time()
+        current_time = self.clock.time()
         
         # 如果距离上次检查未超过间隔时间且有缓存数据，直接返回缓存
         if (self._last_check_time and 
@@ -77,7 +103,7 @@ class StockMonitor:
             return self._current_data
 
         try:
-            self._current_data = self.analyzer.process_and_analyze()
+            self._current_data = self._analyze()
             self._last_check_time = current_time
             return self._current_data
         except Exception as e:
@@ -126,59 +152,123 @@ class StockMonitor:
         except Exception as e:
             logger.error(f"清理输出文件失败: {str(e)}")
 
-    def start(self) -> None:
-        """启动监控"""
-        logger.info("启动股票监控程序")
-        self.is_running = True
-        
-        # 清理输出文件
-        self.clean_output_files()
-        
+    def start_session(self) -> None:
+        """盘前准备：清理输出文件、加载之前的股票记录并预先加载历史数据
+
+        同一天内重复调用不会重新初始化，交易时段中重启不会丢失已提醒的股票。
+        """
+        today = self.clock.now().date()
+        if self._session_day == today:
+            logger.info("本交易日监控已初始化，继续运行")
+            return
+
+        # 进程在交易时段中重启时保留当天的记录，避免重复提醒
+        if self.previous_file.exists() and datetime.fromtimestamp(self.previous_file.stat().st_mtime).date() == today:
+            logger.info("继续使用本交易日的股票记录")
+        else:
+            self.clean_output_files()
+
         # 初始化
         self.load_previous_stocks()
-        
-        # 测试  
-        result_df = self.analyzer.process_and_analyze()
-        print(result_df)
-
-        while self.is_running:
-            try:
-                if self.market_time_tools.is_market_time() == 1:
-                    self.check_stocks()
-                else:
-                    logger.info("当前不在交易时间")
-                    self.stop()
-                    
-                logger.info("等待下一次检查...")
-                time.sleep(self.check_interval)
-                
-            except KeyboardInterrupt:
-                self.stop()
-            except Exception as e:
-                logger.error(f"监控异常: {str(e)}")
-                time.sleep(self.check_interval)
+        self.analyzer.load_history(force=True)
+        self._session_day = today
+
+    def end_session(self) -> None:
+        """盘后处理：写完快照日志，为下一个交易日预先计算历史数据，并清理过期的缓存文件"""
+        if self.recorder is not None:
+            self.recorder.flush()
+        logger.info(f"本交易日共提醒 {len(self.previous_stocks)} 只股票, 检查统计: {self.get_polling_stats()}")
+        self.analyzer.load_history(force=True)
+        keep_days = int(self.config.get_config("Cache.Settings", "keep_days", 30))
+        get_cache_manifest().gc((self.clock.now() - timedelta(days=keep_days)).strftime('%Y%m%d'))
+
+    def start(self) -> None:
+        """启动监控，按交易日历运行直到停止"""
+        logger.info("启动股票监控程序")
+        SessionScheduler(self).run()
 
     def stop(self) -> None:
-        """停止监控"""
+        """停止监控，发送完队列中的邮件"""
         self.is_running = False
+        if self.recorder is not None:
+            self.recorder.flush()
+        close_notifier = getattr(self.email_notifier, "close", None)
+        if close_notifier is not None:
+            close_notifier()
         logger.info("监控程序已停止")
     
+    def _analyze(self) -> pd.DataFrame:
+        """获取并分析一次实时数据，记录耗时和接近新高的股票数"""
+        start = time.perf_counter()
+        try:
+            self.fetch_count += 1
+            return self.analyzer.process_and_analyze()
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+            self.near_high_count = self.polling.count_near_high(self.analyzer.distance_to_high())
+
+    def next_check_interval(self) -> float:
+        """根据最近一次检查的结果和当前时间计算下一次检查的间隔"""
+        self.current_interval = self.polling.next_interval(self.clock.now(), self.near_high_count)
+        return self.current_interval
+
+    def get_polling_stats(self) -> Dict[str, float]:
+        """获取检查次数、耗时和当前间隔，用于调整检查间隔策略"""
+        latencies = np.asarray(self.latencies) * 1000
+        stats = {
+            'fetch_count': self.fetch_count,
+            'near_high_count': self.near_high_count,
+            'current_interval': self.current_interval,
+        }
+        if len(latencies):
+            stats.update({
+                'latency_mean_ms': float(latencies.mean()),
+                'latency_p95_ms': float(np.percentile(latencies, 95)),
+                'latency_max_ms': float(latencies.max()),
+            })
+        return stats
+
     def get_current_status(self) -> dict:
         """获取当前监控状态"""
         return {
             'is_running': self.is_running,
             'is_market_time': self.market_time_tools.is_market_time(),
-            'previous_stocks_count': len(self.previous_stocks)
+            'previous_stocks_count': len(self.previous_stocks),
+            **self.get_polling_stats()
         }
     
     def get_latest_data(self) -> pd.DataFrame:
         """获取最新分析数据"""
-        return self.analyzer.process_and_analyze()
+        return self._analyze()
 
 class EmailNotifier:
-    """邮件通知类"""
-    def __init__(self, config: ConfigTools):
+    """邮件通知类
+
+    邮件由后台队列发送，send_alerts 只负责放入队列；相同的邮箱账号复用同一个发送器及其长连接。
+    """
+    def __init__(self, config: ConfigTools, dispatcher: Optional[MailDispatcher] = None):
         self.config = config
+        self.dispatcher = dispatcher or MailDispatcher()
+        self._senders: Dict[Tuple[str, int, str, str], StockReportSender] = {}
+
+    def _get_report_sender(self, section: str) -> StockReportSender:
+        """获取配置节对应邮箱账号的发送器，账号配置修改后创建新的发送器"""
+        account = (
+            self.config.get_config(section, "smtp_server"),
+            int(self.config.get_config(section, "smtp_port")),
+            self.config.get_config(section, "sender"),
+            self.config.get_config(section, "password"),
+        )
+        report_sender = self._senders.get(account)
+        if report_sender is None:
+            report_sender = StockReportSender(
+                smtp_server=account[0],
+                smtp_port=account[1],
+                sender=account[2],
+                password=account[3]
+            )
+            self._senders[account] = report_sender
+        return report_sender
 
     def _generate_email_subject(self, df: pd.DataFrame) -> str:
         """生成邮件标题"""
@@ -207,21 +297,25 @@ class EmailNotifier:
             # 生成邮件标题
             email_subject = self._generate_email_subject(df)
             
+            # 发送任务使用数据副本，监控循环之后修改数据不影响排队中的邮件
+            df = df.copy()
             for section in email_sections:
                 try:
-                    report_sender = StockReportSender(
-                        smtp_server=self.config.get_config(section, "smtp_server"),
-                        smtp_port=int(self.config.get_config(section, "smtp_port")),
-                        sender=self.config.get_config(section, "sender"),
-                        password=self.config.get_config(section, "password")
-                    )
-                    report_sender.send_stock_report(
+                    job = partial(
+                        self._get_report_sender(section).send_stock_report,
                         df=df,
                         receiver=self.config.get_config(section, "receiver"),
                         subject=email_subject  # 添加自定义标题
                     )
-                    logger.info(f"使用 {section} 发送邮件成功")
+                    if self.dispatcher.submit(f"使用 {section} 发送邮件", job):
+                        logger.info(f"使用 {section} 发送的邮件已加入队列")
                 except Exception as e:
                     logger.error(f"使用 {section} 发送邮件失败: {str(e)}")
         except Exception as e:
-            logger.error(f"发送邮件提醒失败: {str(e)}")
\ No newline at end of file
+            logger.error(f"发送邮件提醒失败: {str(e)}")
+
+    def close(self) -> None:
+        """发送完队列中的邮件并关闭与邮件服务器的连接"""
+        self.dispatcher.stop()
+        for report_sender in self._senders.values():
+            report_sender.close()
\ No newline at end of file